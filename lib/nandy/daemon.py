@@ -0,0 +1,308 @@
+"""
+Module for running Nandy's reminders as a long lived process
+
+    python -m nandy.daemon
+"""
+
+import os
+import sys
+import time
+import socket
+import signal
+import logging
+import argparse
+import threading
+
+import nandy.data
+
+
+class Daemon(object):
+    """
+    Runs remind_chore until stopped. Rather than a fixed sleep, it sleeps till
+    the earliest a chore's due, but wakes early on anything from the event
+    channel, as that's chores changing. Sends how long each tick took, and how
+    late it was, as remind.latency and remind.lag.
+
+    Given shards, see NandyData.shard_filter, it only reminds those it holds
+    the lease for, taking up to most of them. Run several with the same shards
+    and they split them up, each chore reminded by just one, and any a worker
+    stops renewing get taken over once its lease expires.
+    """
+
+    def __init__(self, data=None, idle=60, minimum=0.1, wait=1, logger=None, shards=None, most=None, ttl=None, holder=None):
+
+        self.data = data or nandy.data.NandyData()
+
+        # Longest to sleep with nothing due, shortest between ticks, and
+        # longest to block listening before checking if we're stopping
+
+        self.idle = idle
+        self.minimum = minimum
+        self.wait = wait
+
+        self.logger = logger or logging.getLogger("nandy")
+        self.stopping = threading.Event()
+
+        # Leases get renewed every tick, which is at most idle apart, so they
+        # need to last longer than that plus however long a tick takes
+
+        self.shards = shards
+        self.most = most
+        self.ttl = ttl or idle * 2
+        self.holder = holder or f"{socket.gethostname()}/{os.getpid()}"
+        self.held = []
+
+        self.ticks = 0
+        self.woken = 0
+        self.errors = 0
+
+        self.latency = None
+        self.lag = None
+
+    def lease(self, shard):
+
+        return f"remind/{self.data.shard_name(shard)}"
+
+    def claim(self):
+        """
+        Renews the leases we hold, then takes whatever free ones we can,
+        up to most
+        """
+
+        held = [shard for shard in self.held if self.data.lease_acquire(self.lease(shard), self.holder, self.ttl)]
+
+        for shard in self.shards:
+
+            if self.most is not None and len(held) >= self.most:
+                break
+
+            if shard not in held and self.data.lease_acquire(self.lease(shard), self.holder, self.ttl):
+                held.append(shard)
+
+        self.held = held
+
+    def release(self):
+        """
+        Gives up all our leases so others can take over right away
+        """
+
+        for shard in self.held:
+            self.data.lease_release(self.lease(shard), self.holder)
+
+        self.held = []
+
+    def next(self):
+        """
+        The earliest a chore we're responsible for is due
+        """
+
+        if self.shards is None:
+            return self.data.remind_next()
+
+        dues = [self.data.remind_next(shard) for shard in self.held]
+        dues = [due for due in dues if due is not None]
+
+        return min(dues) if dues else None
+
+    def until(self, now, due):
+        """
+        When to tick next, the earliest due but not past idle from now, and
+        not sooner than minimum. A chore's only reminded once it's past due,
+        so one due right now stays due after a tick, and would spin us.
+        """
+
+        if due is None:
+            due = now + self.idle
+
+        return min(max(due, now + self.minimum), now + self.idle)
+
+    def sleep(self, until):
+        """
+        Waits till until, a stop, or an event, whichever's first. Returns
+        whether an event woke us.
+        """
+
+        while not self.stopping.is_set():
+
+            remaining = until - self.data.now()
+
+            if remaining <= 0:
+                return False
+
+            if self.data.event.next(timeout=min(remaining, self.wait)) is not None:
+
+                # However many changes, one tick covers them all
+
+                self.data.event.drain()
+                self.woken += 1
+
+                return True
+
+        return False
+
+    def tick(self, due=None):
+        """
+        Sends reminders once, measuring how long that took, and if due was
+        given, how far past it we started
+        """
+
+        start = self.data.now()
+        began = time.perf_counter()
+
+        if self.shards is None:
+            self.data.remind_chore()
+        else:
+            self.claim()
+            for shard in self.held:
+                self.data.remind_chore(shard)
+
+        self.latency = time.perf_counter() - began
+        self.data.graphite.send("remind", "latency", self.latency, start)
+
+        if due is not None:
+            self.lag = max(start - due, 0)
+            self.data.graphite.send("remind", "lag", self.lag, start)
+
+        self.ticks += 1
+
+    def backoff(self, failures):
+        """
+        How long to wait after failures in a row, doubling from minimum up
+        to idle
+        """
+
+        return min(self.minimum * 2 ** (failures - 1), self.idle)
+
+    def rollback(self):
+        """
+        Rolls back after a failure, which with the database gone can fail too
+        """
+
+        try:
+            self.data.mysql.session.rollback()
+        except Exception:
+            self.logger.exception("rollback failed")
+
+    def run(self):
+        """
+        Ticks until stopped, sending whatever metrics are left at the end
+        """
+
+        scheduled = False
+        failures = 0
+        due = None
+
+        while not self.stopping.is_set():
+
+            # Nothing going wrong, a bad tick or MySQL or Redis going away,
+            # should take the reminders down with it, just slow them down
+
+            try:
+
+                # Catch up on chores saved without a due, just the once as it
+                # looks at every chore that'll never be due
+
+                if not scheduled:
+                    self.data.remind_schedule()
+                    scheduled = True
+
+                self.tick(due)
+
+                due = self.next()
+
+                # Don't hold a transaction, and what it's seen, open while sleeping
+
+                self.data.mysql.session.commit()
+
+                until = self.until(self.data.now(), due)
+                woken = self.sleep(until)
+
+                # Woken early, or with nothing due, we weren't late for anything
+
+                due = until if due is not None and not woken else None
+                failures = 0
+
+            except Exception:
+
+                self.errors += 1
+                self.logger.exception("remind failed")
+                self.rollback()
+
+                due = None
+                failures += 1
+
+                self.stopping.wait(self.backoff(failures))
+
+        # Whatever we can't release expires anyway
+
+        if self.shards is not None:
+            try:
+                self.release()
+            except Exception:
+                self.logger.exception("release failed")
+
+        self.data.mysql.session.close()
+
+        if hasattr(self.data.graphite, "stop"):
+            self.data.graphite.stop()
+
+    def stop(self, *args):
+        """
+        Has run finish after the tick it's on, usable as a signal handler
+        """
+
+        self.stopping.set()
+
+
+def shard(value):
+    """
+    Parses a shard, LOW-HIGH for a range of person ids, or INDEX/COUNT
+    """
+
+    if "-" in value:
+        low, high = value.split("-")
+        return range(int(low), int(high))
+
+    index, count = value.split("/")
+    return (int(index), int(count))
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Sends chore and task reminders as they come due")
+    parser.add_argument("--idle", type=float, default=60, help="longest to sleep with nothing due")
+    parser.add_argument("--minimum", type=float, default=0.1, help="shortest to sleep between ticks")
+    parser.add_argument("--wait", type=float, default=1, help="longest to block before checking for a stop")
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument("--shards", type=int, help="split chores into this many shards by person")
+    sharding.add_argument("--shard", type=shard, action="append", help="just these shards, INDEX/COUNT or LOW-HIGH person ids, repeatable")
+    parser.add_argument("--most", type=int, help="most shards to take at once")
+    parser.add_argument("--ttl", type=float, help="how long leases on shards last, twice idle by default")
+    args = parser.parse_args(argv)
+
+    shards = args.shard
+
+    if args.shards:
+        shards = [(index, args.shards) for index in range(args.shards)]
+
+    logging.basicConfig(level=logging.INFO)
+
+    daemon = Daemon(
+        idle=args.idle,
+        minimum=args.minimum,
+        wait=args.wait,
+        shards=shards,
+        most=args.most,
+        ttl=args.ttl
+    )
+
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+
+    daemon.run()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,16 @@
 import time
 import copy
+import json
+import asyncio
+import functools
+import threading
+import contextlib
+import concurrent.futures
+
+import sqlalchemy
+import sqlalchemy.exc
+import sqlalchemy.event
+import sqlalchemy.orm.exc
 
 import nandy.store.redis
 import nandy.store.mysql
@@ -9,15 +20,363 @@ class NandyData(object):
     """
     Main class for interacting with Nandy data
     We have lots of similar functions because it's easier to read with all the interdependecies
+    Threads can share one, each gets its own session, transactions and batches
     """
 
-    def __init__(self):
+    # What callers call, as opposed to the helpers underneath
+
+    OPERATIONS = ("person_", "area_", "template_", "chore_", "task_", "act_", "remind_chore")
+
+    def __init__(self, mysql=None, person_ttl=60, graphite=None, instrument=None, cache=None, task_table=False, clock=None):
 
         self.speech = nandy.store.redis.Channel("speech")
-        self.mysql = nandy.store.mysql.MySQL()
-        self.graphite = nandy.store.graphite.Graphite()
+        self.mysql = mysql or nandy.store.mysql.MySQL()
+
+        # Anything with Graphite's send and batch, like nandy.store.metrics.Metrics
+
+        self.graphite = graphite or nandy.store.graphite.Graphite()
         self.event = nandy.store.redis.Channel("event")
 
+        # Transactions are per thread, as the session is, see transacting
+
+        self.local = threading.local()
+
+        # Person name to (id, expires) cache, the MySQL's so everything
+        # sharing it, like AsyncNandyData's threads, forgets together
+
+        self.persons = self.mysql.persons
+        self.persons_lock = self.mysql.persons_lock
+        self.person_ttl = person_ttl
+
+        # Optional read through cache for areas and templates, see nandy.store.cache
+
+        self.cache = cache
+
+        # Whether new chores keep their tasks in the task table instead of data
+
+        self.task_table = task_table
+
+        # What tells the time, time.time unless something else is wanted, like
+        # a fixed one for benchmarks
+
+        self.clock = clock
+
+        # Keep chores scheduled, just the once if the MySQL is shared
+
+        if self.mysql.scheduler is None:
+            self.mysql.scheduler = self.schedule
+
+        # Opt in timing of operations, see nandy.instrument
+
+        self.instrument = instrument
+
+        if instrument:
+            instrument.attach(self)
+
+    # Time
+
+    def now(self):
+        """
+        The current time from the clock
+        """
+
+        if self.clock is not None:
+            return self.clock()
+
+        return time.time()
+
+    # Transaction
+
+    @property
+    def transacting(self):
+        """
+        How many transactions this thread's in
+        """
+
+        return getattr(self.local, "transacting", 0)
+
+    @transacting.setter
+    def transacting(self, value):
+
+        self.local.transacting = value
+
+    @property
+    def invalidated(self):
+        """
+        What this thread's to clear from the cache once its transaction's over
+        """
+
+        if not hasattr(self.local, "invalidated"):
+            self.local.invalidated = set()
+
+        return self.local.invalidated
+
+    @invalidated.setter
+    def invalidated(self, value):
+
+        self.local.invalidated = value
+
+    def commit(self):
+        """
+        Commits the session, unless we're in a transaction
+        """
+
+        if not self.transacting:
+            self.mysql.session.commit()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Holds off all commits inside till the end, rolling back on errors.
+        Speech and metrics are batched as well and sent in one go, but only
+        once the commit's gone through, and not at all if it doesn't.
+        """
+
+        self.transacting += 1
+
+        try:
+
+            with self.speech.batch(), self.graphite.batch():
+
+                try:
+                    yield self
+                finally:
+                    self.transacting -= 1
+
+                # Still inside the batches so a failed commit drops them too
+
+                self.commit()
+
+        except Exception:
+            if not self.transacting:
+                self.mysql.session.rollback()
+                self.revalidate()
+            raise
+
+        if not self.transacting:
+            self.revalidate()
+
+    # Cache
+
+    def freeze(self, instance):
+        """
+        Plain copy of a model's columns, or a list of them, safe to keep
+        """
+
+        if instance is None:
+            return None
+
+        if isinstance(instance, list):
+            return [self.freeze(item) for item in instance]
+
+        values = {}
+
+        for column in instance.__table__.columns:
+            value = getattr(instance, column.key)
+            values[column.key] = copy.deepcopy(dict(value)) if isinstance(value, dict) else value
+
+        return values
+
+    def thaw(self, model, values):
+        """
+        Model from frozen columns, in this session without querying
+        """
+
+        if values is None:
+            return None
+
+        if isinstance(values, list):
+            return [self.thaw(model, item) for item in values]
+
+        # Use what the session already has, as there can only be one
+
+        primary = model.__mapper__.primary_key[0].key
+        existing = self.mysql.session.identity_map.get(sqlalchemy.orm.util.identity_key(model, values[primary]))
+
+        if existing is not None:
+            return existing
+
+        instance = model(**copy.deepcopy(values))
+        sqlalchemy.orm.make_transient_to_detached(instance)
+        self.mysql.session.add(instance)
+
+        return instance
+
+    def cached(self, model, key, load):
+        """
+        Loads through the cache, if there is one
+        """
+
+        if self.cache is None:
+            return load()
+
+        return self.thaw(model, self.cache.fetch(model.__tablename__, key, lambda: self.freeze(load())))
+
+    def invalidate(self, model):
+        """
+        Clears a model from the cache. Inside a transaction, it's cleared again
+        at the end in case uncommitted rows got cached meanwhile.
+        """
+
+        if self.cache is None:
+            return
+
+        self.cache.clear(model.__tablename__)
+
+        if self.transacting:
+            self.invalidated.add(model)
+
+    def revalidate(self):
+        """
+        Clears whatever was invalidated during a transaction
+        """
+
+        invalidated, self.invalidated = self.invalidated, set()
+
+        for model in invalidated:
+            self.cache.clear(model.__tablename__)
+
+    # Listing
+
+    OPERATORS = {
+        "eq": lambda column, value: column == value,
+        "ne": lambda column, value: column != value,
+        "lt": lambda column, value: column < value,
+        "lte": lambda column, value: column <= value,
+        "gt": lambda column, value: column > value,
+        "gte": lambda column, value: column >= value,
+        "in": lambda column, value: column.in_(value),
+        "notin": lambda column, value: column.notin_(value),
+        "like": lambda column, value: column.like(value),
+        "null": lambda column, value: column.is_(None) if value else column.isnot(None)
+    }
+
+    def field(self, model, name):
+        """
+        Column of a model by name, checking it's really a column
+        """
+
+        if name not in model.__table__.columns:
+            raise ValueError(f"unknown field {name}")
+
+        return getattr(model, name)
+
+    def filters(self, model, filter=None):
+        """
+        Compiles a filter to SQL. Keys are either a field, equal to the value,
+        or field__operator, like {"created__gte": 7, "person_id__in": [1, 2]}
+        """
+
+        expressions = []
+
+        for key, value in (filter or {}).items():
+
+            name, operator = key.split("__", 1) if "__" in key else (key, "eq")
+
+            if operator not in self.OPERATORS:
+                raise ValueError(f"unknown operator {operator}")
+
+            expressions.append(self.OPERATORS[operator](self.field(model, name), value))
+
+        return expressions
+
+    def ordering(self, model, order):
+        """
+        Turns field names, - first for descending, into the columns and
+        directions for page, adding the primary key to break any ties
+        """
+
+        columns = []
+        descending = []
+
+        for name in order:
+            columns.append(self.field(model, name.lstrip("-")))
+            descending.append(name.startswith("-"))
+
+        primary = model.__mapper__.primary_key[0].key
+
+        if primary not in [column.key for column in columns]:
+            columns.append(getattr(model, primary))
+            descending.append(descending[-1])
+
+        return columns, descending
+
+    def query(self, model, fields=None):
+        """
+        Queries whole models, or just the named fields as lightweight rows that
+        skip loading and decoding data
+        """
+
+        if fields is None:
+            return self.mysql.session.query(model)
+
+        return self.mysql.session.query(*[getattr(model, field) for field in fields])
+
+    def page(self, query, order, descending=False, cursor=None, limit=None):
+        """
+        Orders a query and pages it by keyset, so deep pages cost the same as the
+        first. The order columns must be unique together, and descending is
+        either for all of them or a list for each. The cursor is the last row
+        of the previous page, or its values of the order columns.
+        """
+
+        if isinstance(descending, bool):
+            descending = [descending] * len(order)
+
+        # Rows of just some fields get any missing order columns on the end,
+        # so they can be cursors too
+
+        descriptions = query.column_descriptions
+
+        if not any(isinstance(description["expr"], type) for description in descriptions):
+            names = [description["name"] for description in descriptions]
+            query = query.add_columns(*[column for column in order if column.key not in names])
+
+        if cursor is not None:
+
+            # Models and fields rows (which have keys) give their own values
+
+            if isinstance(cursor, nandy.store.mysql.Base) or hasattr(cursor, "keys"):
+                cursor = [getattr(cursor, column.key) for column in order]
+
+            # (a, b) after (x, y) is a after x, or a is x and b after y, spelled
+            # out as MySQL won't use an index for row comparisons
+
+            after = []
+
+            for index, column in enumerate(order):
+                after.append(sqlalchemy.and_(
+                    *[order[equal] == cursor[equal] for equal in range(index)],
+                    column < cursor[index] if descending[index] else column > cursor[index]
+                ))
+
+            query = query.filter(sqlalchemy.or_(*after))
+
+        query = query.order_by(*[column.desc() if descending[index] else column for index, column in enumerate(order)])
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return query
+
+    def stream(self, query, order, descending=False, size=100):
+        """
+        Yields every row of a query, fetching a page of size at a time
+        """
+
+        cursor = None
+
+        while True:
+
+            rows = self.page(query, order, descending, cursor, size).all()
+
+            yield from rows
+
+            if len(rows) < size:
+                return
+
+            cursor = rows[-1]
+
     # Person
 
     def person_create(self, fields):
@@ -27,24 +386,85 @@ class NandyData(object):
         
         person = nandy.store.mysql.Person(**fields)
         self.mysql.session.add(person)
-        self.mysql.session.commit()
+        self.commit()
+
+        with self.persons_lock:
+            self.persons.pop(person.name, None)
 
         return person
 
-    def person_list(self, filter=None):
+    def person_id(self, name):
         """
-        Lists Persons based on filter
+        Looks up a Person id by name, cached for person_ttl seconds
         """
 
-        if filter is None:
-            filter = {}
+        return self.person_ids([name])[name]
 
-        return self.mysql.session.query(
-            nandy.store.mysql.Person
-        ).filter_by(
-            **filter
-        ).order_by(
-            nandy.store.mysql.Person.name
+    def person_ids(self, names):
+        """
+        Looks up Person ids by name, from the cache or else all in one 
+        query. Loads the whole Persons so relationships to them don't
+        need queries of their own
+        """
+
+        now = self.now()
+
+        with self.persons_lock:
+            ids = {
+                name: self.persons[name][0] 
+                for name in names 
+                if name in self.persons and self.persons[name][1] > now
+            }
+
+        missing = [name for name in names if name not in ids]
+
+        if missing:
+
+            for person in self.mysql.session.query(
+                nandy.store.mysql.Person
+            ).filter(
+                nandy.store.mysql.Person.name.in_(missing)
+            ):
+                ids[person.name] = person.person_id
+
+                with self.persons_lock:
+                    self.persons[person.name] = (person.person_id, now + self.person_ttl)
+
+            # Same as looking up one that's not there
+
+            for name in missing:
+                if name not in ids:
+                    raise sqlalchemy.orm.exc.NoResultFound(f"No person named {name}")
+
+        return ids
+
+    def person_forget(self, person_id):
+        """
+        Drops a Person from the cache, for everything sharing it
+        """
+
+        with self.persons_lock:
+            for name in [name for name, cached in self.persons.items() if cached[0] == person_id]:
+                del self.persons[name]
+
+    def person_list(self, filter=None, limit=None, cursor=None, fields=None, order=None):
+        """
+        Lists Persons based on filter (see filters), ordered by order (see
+        ordering), name by default. Pages with limit, cursor being the last
+        Person of the previous page. With fields, rows of just those plus the
+        order columns.
+        """
+
+        return self.page(
+            self.query(
+                nandy.store.mysql.Person,
+                fields
+            ).filter(
+                *self.filters(nandy.store.mysql.Person, filter)
+            ),
+            *self.ordering(nandy.store.mysql.Person, order or ["name"]),
+            cursor=cursor,
+            limit=limit
         ).all()
 
     def person_retrieve(self, person_id):
@@ -70,7 +490,8 @@ class NandyData(object):
         ).update(
             fields
         )
-        self.mysql.session.commit()
+        self.commit()
+        self.person_forget(person_id)
         return rows
 
     def person_delete(self, person_id):
@@ -83,7 +504,8 @@ class NandyData(object):
         ).filter_by(
             person_id=person_id
         ).delete()
-        self.mysql.session.commit()
+        self.commit()
+        self.person_forget(person_id)
         return rows
 
     # Area
@@ -95,35 +517,52 @@ class NandyData(object):
         
         area = nandy.store.mysql.Area(**fields)
         self.mysql.session.add(area)
-        self.mysql.session.commit()
+        self.commit()
+        self.invalidate(nandy.store.mysql.Area)
 
         return area
 
-    def area_list(self, filter=None):
+    def area_list(self, filter=None, limit=None, cursor=None, fields=None, order=None):
         """
-        Lists Areas based on filter
+        Lists Areas based on filter (see filters), ordered by order (see
+        ordering), name by default. Pages with limit, cursor being the last
+        Area of the previous page. With fields, rows of just those plus the
+        order columns. Whole Areas are cached unless paging by a row.
         """
 
-        if filter is None:
-            filter = {}
+        def load():
+            return self.page(
+                self.query(
+                    nandy.store.mysql.Area,
+                    fields
+                ).filter(
+                    *self.filters(nandy.store.mysql.Area, filter)
+                ),
+                *self.ordering(nandy.store.mysql.Area, order or ["name"]),
+                cursor=cursor,
+                limit=limit
+            ).all()
 
-        return self.mysql.session.query(
-            nandy.store.mysql.Area
-        ).filter_by(
-            **filter
-        ).order_by(
-            nandy.store.mysql.Area.name
-        ).all()
+        if fields is not None or isinstance(cursor, nandy.store.mysql.Base) or hasattr(cursor, "keys"):
+            return load()
+
+        key = json.dumps(["list", filter, limit, cursor, order], sort_keys=True, default=str)
+
+        return self.cached(nandy.store.mysql.Area, key, load)
 
     def area_retrieve(self, area_id):
         """
         Retrieves Area based on id
         """
 
-        return self.mysql.session.query(
-            nandy.store.mysql.Area
-        ).get(
-            area_id
+        return self.cached(
+            nandy.store.mysql.Area,
+            json.dumps(["retrieve", area_id]),
+            lambda: self.mysql.session.query(
+                nandy.store.mysql.Area
+            ).get(
+                area_id
+            )
         )
 
     def area_update(self, area_id, fields):
@@ -138,7 +577,8 @@ class NandyData(object):
         ).update(
             fields
         )
-        self.mysql.session.commit()
+        self.commit()
+        self.invalidate(nandy.store.mysql.Area)
         return rows
 
     def area_status(self, area, current):
@@ -149,9 +589,10 @@ class NandyData(object):
         if area.status == current:
             return False
 
-        area.updated = time.time()
+        area.updated = self.now()
         area.status = current
-        self.mysql.session.commit()
+        self.commit()
+        self.invalidate(nandy.store.mysql.Area)
 
         for status in area.data["statuses"]:
             if current == status["value"]: 
@@ -170,7 +611,8 @@ class NandyData(object):
         ).filter_by(
             area_id=area_id
         ).delete()
-        self.mysql.session.commit()
+        self.commit()
+        self.invalidate(nandy.store.mysql.Area)
         return rows
 
     # Template
@@ -182,36 +624,52 @@ class NandyData(object):
         
         template = nandy.store.mysql.Template(**fields)
         self.mysql.session.add(template)
-        self.mysql.session.commit()
+        self.commit()
+        self.invalidate(nandy.store.mysql.Template)
 
         return template
 
-    def template_list(self, filter=None):
+    def template_list(self, filter=None, limit=None, cursor=None, fields=None, order=None):
         """
-        Lists Templates based on filter
+        Lists Templates based on filter (see filters), ordered by order (see
+        ordering), name by default. Pages with limit, cursor being the last
+        Template of the previous page. With fields, rows of just those plus the
+        order columns. Whole Templates are cached unless paging by a row.
         """
 
-        if filter is None:
-            filter = {}
+        def load():
+            return self.page(
+                self.query(
+                    nandy.store.mysql.Template,
+                    fields
+                ).filter(
+                    *self.filters(nandy.store.mysql.Template, filter)
+                ),
+                *self.ordering(nandy.store.mysql.Template, order or ["name"]),
+                cursor=cursor,
+                limit=limit
+            ).all()
 
-        return self.mysql.session.query(
-            nandy.store.mysql.Template
-        ).filter_by(
-            **filter
-        ).order_by(
-            nandy.store.mysql.Template.name, 
-            nandy.store.mysql.Template.kind
-        ).all()
+        if fields is not None or isinstance(cursor, nandy.store.mysql.Base) or hasattr(cursor, "keys"):
+            return load()
+
+        key = json.dumps(["list", filter, limit, cursor, order], sort_keys=True, default=str)
+
+        return self.cached(nandy.store.mysql.Template, key, load)
 
     def template_retrieve(self, template_id):
         """
         Retrieves Template based on id
         """
 
-        return self.mysql.session.query(
-            nandy.store.mysql.Template
-        ).get(
-            template_id
+        return self.cached(
+            nandy.store.mysql.Template,
+            json.dumps(["retrieve", template_id]),
+            lambda: self.mysql.session.query(
+                nandy.store.mysql.Template
+            ).get(
+                template_id
+            )
         )
 
     def template_update(self, template_id, fields):
@@ -226,7 +684,8 @@ class NandyData(object):
         ).update(
             fields
         )
-        self.mysql.session.commit()
+        self.commit()
+        self.invalidate(nandy.store.mysql.Template)
         return rows
 
     def template_delete(self, template_id):
@@ -239,20 +698,108 @@ class NandyData(object):
         ).filter_by(
             template_id=template_id
         ).delete()
-        self.mysql.session.commit()
+        self.commit()
+        self.invalidate(nandy.store.mysql.Template)
+        return rows
+
+    # Lease
+
+    def lease_acquire(self, name, holder, ttl):
+        """
+        Takes or renews a lease for ttl seconds, if no one else holds it.
+        Returns whether we have it.
+        """
+
+        now = self.now()
+
+        # Ours or expired, it's just an update
+
+        rows = self.mysql.session.query(
+            nandy.store.mysql.Lease
+        ).filter(
+            nandy.store.mysql.Lease.name == name,
+            sqlalchemy.or_(
+                nandy.store.mysql.Lease.holder == holder,
+                nandy.store.mysql.Lease.expires <= now
+            )
+        ).update(
+            {"holder": holder, "expires": now + ttl},
+            synchronize_session=False
+        )
+
+        # Never taken, whoever inserts first gets it
+
+        if not rows:
+
+            try:
+                self.mysql.session.execute(nandy.store.mysql.Lease.__table__.insert().values(
+                    name=name,
+                    holder=holder,
+                    expires=now + ttl
+                ))
+            except sqlalchemy.exc.IntegrityError:
+                self.mysql.session.rollback()
+                return False
+
+        self.commit()
+        return True
+
+    def lease_release(self, name, holder):
+        """
+        Gives up a lease if we hold it
+        """
+
+        rows = self.mysql.session.query(
+            nandy.store.mysql.Lease
+        ).filter_by(
+            name=name,
+            holder=holder
+        ).delete(
+            synchronize_session=False
+        )
+        self.commit()
         return rows
 
+    # Shard
+
+    def shard_name(self, shard):
+        """
+        What to call a shard, for its lease
+        """
+
+        if isinstance(shard, range):
+            return f"{shard.start}-{shard.stop}"
+
+        return f"{shard[0]}/{shard[1]}"
+
+    def shard_filter(self, shard):
+        """
+        Which chores are in a shard. Either (index, count), the persons whose
+        id modulo count is index, or a range of person ids.
+        """
+
+        if isinstance(shard, range):
+            return sqlalchemy.and_(
+                nandy.store.mysql.Chore.person_id >= shard.start,
+                nandy.store.mysql.Chore.person_id < shard.stop
+            )
+
+        return nandy.store.mysql.Chore.person_id % shard[1] == shard[0]
+
     # Speak
 
-    def speak_chore(self, text, chore):
+    def speak_chore(self, text, chore, now=None):
         """
         Says something on the speaking channel from a chore
         """
 
+        if now is None:
+            now = self.now()
+
         # Follows the standards format
 
         message = {
-            "timestamp": time.time(),
+            "timestamp": now,
             "text": f"{chore.person.name}, {text}",
             "language": chore.data["language"]
         }
@@ -261,26 +808,35 @@ class NandyData(object):
             message["node"] = chore.data["node"]
 
         self.speech.publish(message)
-        chore.data["notified"] = time.time()
-        chore.data["updated"] = time.time()
+        chore.data["notified"] = now
+        chore.data["updated"] = now
 
-    def speak_task(self, text, task, chore):
+    def speak_task(self, text, task, chore, now=None):
         """
         Says something on the speaking channel
         """
 
+        if now is None:
+            now = self.now()
+
         # Hit up chore and indicated we've been notified
 
-        self.speak_chore(text, chore)
-        task["notified"] = time.time() 
+        self.speak_chore(text, chore, now)
+        task["notified"] = now
 
     # Remind
 
-    def remind(self, data):
+    def remind(self, data, now=None):
+        """
+        Whether something's due for a reminder now
+        """
+
+        if now is None:
+            now = self.now()
 
         # If it has a delay and isn't time yet, don't bother yet
 
-        if "delay" in data and data["delay"] + data["start"] > time.time():
+        if "delay" in data and data["delay"] + data.get("start", 0) > now:
             return False
 
         # If it's paused, don't bother either
@@ -290,52 +846,239 @@ class NandyData(object):
 
         # If it has an interval and it's more been more than that since the last notification
 
-        if "interval" in data and time.time() > data["notified"] + data["interval"]:
+        if "interval" in data and now > data.get("notified", 0) + data["interval"]:
             return True
 
         return False
 
-    def remind_task(self, chore):
+    def due(self, data):
+        """
+        Figures out the earliest time remind could say yes, None if never
+        """
+
+        # Paused or without an interval, remind will never fire
+
+        if "paused" in data and data["paused"]:
+            return None
+
+        if "interval" not in data:
+            return None
+
+        # Missing fields are due right away so remind sees them as before
+
+        due = data.get("notified", 0) + data["interval"]
+
+        if "delay" in data:
+            due = max(due, data["delay"] + data.get("start", 0))
+
+        return due
+
+    def due_chore(self, data, active=None):
+        """
+        Figures out the earliest time a chore or its active task could be reminded.
+        The active task's looked for in data if not given.
+        """
+
+        dues = [self.due(data)]
+
+        # Only the first active task ever gets reminded
+
+        if active is None:
+            for task in data.get("tasks", []):
+                if "start" in task and "end" not in task:
+                    active = task
+                    break
+
+        if active is not None:
+            dues.append(self.due(active))
+
+        dues = [due for due in dues if due is not None]
+
+        return min(dues) if dues else None
+
+    def schedule(self, session, context, instances):
+        """
+        Stores when each new or changed Chore is next due for a reminder
+        """
+
+        chores = []
+
+        # Task rows changing change their chore too
+
+        for instance in list(session.new) + list(session.dirty):
+
+            if isinstance(instance, nandy.store.mysql.Task):
+                instance = instance.chore
+
+            if isinstance(instance, nandy.store.mysql.Chore) and instance.data is not None and instance not in chores:
+                chores.append(instance)
+
+        for chore in chores:
+            chore.due = self.due_chore(chore.data, self.active(chore))
+
+    def remind_task(self, chore, now=None):
         """
         Sees if any reminders need to go out for all tasks of a chore
         """
 
-        for task in chore.data["tasks"]:
+        # Only the first active task
 
-            # If this is the first active task
+        task = self.active(chore)
 
-            if "start" in task and "end" not in task:
-                
-                if self.remind(task):
+        if task is not None and self.remind(task, now):
 
-                    # Notify and sotre that we did
+            # Notify and sotre that we did
 
-                    self.speak_task(f"please {task['text']}", task, chore)
+            self.speak_task(f"please {task['text']}", task, chore, now)
+
+    def remind_chore(self, shard=None):
+        """
+        Sees if any reminders need to go out for all chores and people,
+        or just those in a shard if given
+        """
+
+        # One time for the whole pass so every chore's judged the same
+
+        now = self.now()
+
+        # Only look at chores that are due, with their active tasks from the task
+        # table if any, keeping those in the session. Chores that'll never be due
+        # have no due, same as ones never scheduled, see remind_schedule for those.
+
+        query = self.mysql.session.query(
+            nandy.store.mysql.Chore,
+            nandy.store.mysql.Task
+        ).outerjoin(
+            nandy.store.mysql.Task,
+            sqlalchemy.and_(
+                nandy.store.mysql.Task.chore_id == nandy.store.mysql.Chore.chore_id,
+                nandy.store.mysql.Task.position == nandy.store.mysql.Chore.active
+            )
+        ).filter(
+            nandy.store.mysql.Chore.status == "started",
+            nandy.store.mysql.Chore.due <= now
+        )
+
+        if shard is not None:
+            query = query.filter(self.shard_filter(shard))
+
+        rows = query.all()
+
+        # Send all the reminders in one go, but only once what they've
+        # notified is saved, else they'd all go out again next time
+
+        with self.transaction():
+
+            for chore, task in rows:
+
+                if self.remind(chore.data, now):
+                    self.speak_chore(f"you still have to {chore.data['text']}", chore, now)
+
+                # Only the first active task ever gets reminded
 
-                # We've found the active task, so regardless we're done
+                active = self.active(chore)
 
-                break
+                if active is not None and self.remind(active, now):
+                    self.speak_task(f"please {active['text']}", active, chore, now)
 
-    def remind_chore(self):
+                chore.due = self.due_chore(chore.data, active)
+
+    def remind_schedule(self):
+        """
+        Schedules started chores that have no due, for rows saved without the
+        session, like those from before the column. Chores that'll never be
+        due get looked at every time too, so this is for once at startup, not
+        every tick. Returns how many got a due.
+        """
+
+        scheduled = 0
+
+        for chore in self.mysql.session.query(
+            nandy.store.mysql.Chore
+        ).filter(
+            nandy.store.mysql.Chore.status == "started",
+            nandy.store.mysql.Chore.due.is_(None)
+        ):
+            chore.due = self.due_chore(chore.data, self.active(chore))
+
+            if chore.due is not None:
+                scheduled += 1
+
+        self.commit()
+        return scheduled
+
+    def remind_next(self, shard=None):
+        """
+        The earliest any started chore's due for a reminder, None if none
+        ever will be, just in a shard if given
+        """
+
+        query = self.mysql.session.query(
+            sqlalchemy.func.min(nandy.store.mysql.Chore.due)
+        ).filter(
+            nandy.store.mysql.Chore.status == "started"
+        )
+
+        if shard is not None:
+            query = query.filter(self.shard_filter(shard))
+
+        return query.scalar()
+
+    # Tasks
+
+    def tasks(self, chore):
+        """
+        A chore's tasks as dicts, from its data or the task table, None if
+        it doesn't have any
+        """
+
+        if "tasks" in chore.data:
+            return chore.data["tasks"]
+
+        if chore.tasks:
+            return [nandy.store.mysql.TaskData(task) for task in chore.tasks]
+
+        return None
+
+    def active(self, chore):
         """
-        Sees if any reminders need to go out for all chores and people
+        A chore's first started task not yet ended, None if there isn't one.
+        From the task table, that's straight from the chore's active pointer.
         """
 
-        for chore in self.mysql.session.query(nandy.store.mysql.Chore).filter_by(status="started"):
+        if "tasks" in chore.data:
 
-            if self.remind(chore.data):
-                self.speak_chore(f"you still have to {chore.data['text']}", chore)
+            for task in chore.data["tasks"]:
+                if "start" in task and "end" not in task:
+                    return task
 
-            if "tasks" in chore.data:
-                self.remind_task(chore)
+            return None
 
-        self.mysql.session.commit()
+        if chore.active is None:
+            return None
+
+        return nandy.store.mysql.TaskData(self.mysql.session.query(
+            nandy.store.mysql.Task
+        ).get(
+            (chore.chore_id, chore.active)
+        ))
+
+    def normalize(self, chore):
+        """
+        Moves a new chore's tasks from its data to the task table, if we're
+        using it
+        """
+
+        if not self.task_table or not chore.data.get("tasks"):
+            return
+
+        chore.tasks = nandy.store.mysql.task_rows(chore.data.pop("tasks"))
 
     # Chore
 
-    def chore_create(self, fields=None, template=None):
+    def chore_fields(self, fields=None, template=None):
         """
-        Creates a chore from a template
+        Fills out the fields of a chore to create from a template
         """
 
         if template is None:
@@ -345,7 +1088,7 @@ class NandyData(object):
             fields = {}
 
         fields["status"] = "started"
-        fields["created"] = time.time()
+        fields["created"] = self.now()
         fields["updated"] =  fields["created"]
 
         if "data" not in fields and template:
@@ -355,7 +1098,7 @@ class NandyData(object):
             fields["name"] = template["name"]
 
         if "person" in template and "person_id" not in fields:
-            fields["person_id"] = self.mysql.session.query(nandy.store.mysql.Person).filter_by(name=template["person"]).one().person_id
+            fields["person_id"] = self.person_id(template["person"])
 
         if "language" not in fields["data"]:
             fields["data"]["language"] = "en-us"
@@ -365,42 +1108,113 @@ class NandyData(object):
                 if "id" not in task:
                     task["id"] = index
 
-        # Create and save now because we need the db 
-        # person set up and other things may go wrong
+        return fields
 
-        chore = nandy.store.mysql.Chore(**fields)
-        self.mysql.session.add(chore)
-        self.mysql.session.commit()
+    def chore_start(self, chore):
+        """
+        Starts a freshly created chore and its first task
+        """
 
         # We've start the overall chore.  Notify the person
         # record that we did so.
 
-        chore.data["start"] = time.time()
+        chore.data["start"] = self.now()
         self.speak_chore(f"time to {chore.data['text']}", chore)
 
         # Check for the first tasks and set our changes. 
 
         self.chore_check(chore)
-        self.mysql.session.commit()
+
+    def chore_create(self, fields=None, template=None):
+        """
+        Creates a chore from a template
+        """
+
+        fields = self.chore_fields(fields, template)
+
+        # Create and save now because we need the db 
+        # person set up and other things may go wrong.
+        # Flush so that holds inside a transaction too
+
+        chore = nandy.store.mysql.Chore(**fields)
+        self.normalize(chore)
+        self.mysql.session.add(chore)
+        self.mysql.session.flush()
+        self.commit()
+
+        self.chore_start(chore)
+        self.commit()
 
         return chore
 
-    def chore_list(self, filter=None):
+    def chore_create_many(self, creates):
         """
-        Lists Chores based on filter
+        Creates many chores at once, each create being the fields 
+        and/or template chore_create would take, returned in order
         """
 
-        if filter is None:
-            filter = {}
+        creates = [(create.get("fields"), create.get("template") or {}) for create in creates]
 
-        return self.mysql.session.query(
-            nandy.store.mysql.Chore
-        ).filter_by(
-            **filter
-        ).order_by(
-            nandy.store.mysql.Chore.created.desc()
+        # Look up everyone at once
+
+        self.person_ids(set(
+            template["person"] for fields, template in creates if "person" in template
+        ))
+
+        with self.transaction():
+
+            chores = [
+                nandy.store.mysql.Chore(**self.chore_fields(fields, template))
+                for fields, template in creates
+            ]
+
+            for chore in chores:
+                self.normalize(chore)
+
+            self.mysql.session.add_all(chores)
+            self.mysql.session.flush()
+
+            for chore in chores:
+                self.chore_start(chore)
+
+        return chores
+
+    def chore_list(self, filter=None, limit=None, cursor=None, fields=None, order=None):
+        """
+        Lists Chores based on filter (see filters), ordered by order (see
+        ordering), newest first by default. Pages with limit, cursor being the last
+        Chore of the previous page. With fields, rows of just those plus the
+        order columns.
+        """
+
+        return self.page(
+            self.query(
+                nandy.store.mysql.Chore,
+                fields
+            ).filter(
+                *self.filters(nandy.store.mysql.Chore, filter)
+            ),
+            *self.ordering(nandy.store.mysql.Chore, order or ["-created"]),
+            cursor=cursor,
+            limit=limit
         ).all()
 
+    def chore_stream(self, filter=None, size=100, fields=None, order=None):
+        """
+        Yields every Chore like chore_list, size at a time
+        """
+
+        return self.stream(
+            self.query(
+                nandy.store.mysql.Chore,
+                fields
+            ).filter(
+                *self.filters(nandy.store.mysql.Chore, filter)
+            ),
+            *self.ordering(nandy.store.mysql.Chore, order or ["-created"]),
+            size=size
+        )
+
     def chore_retrieve(self, chore_id):
         """
         Retrieves Chore based on id
@@ -417,6 +1231,21 @@ class NandyData(object):
         Retrieves Chore based on id and fields
         """
 
+        # Bulk updates skip the flush, so schedule here
+
+        if "data" in fields and "due" not in fields:
+
+            active = None
+
+            # Tasks in the task table aren't in data
+
+            if "tasks" not in fields["data"]:
+                chore = self.chore_retrieve(chore_id)
+                if chore is not None and "tasks" not in chore.data:
+                    active = self.active(chore)
+
+            fields["due"] = self.due_chore(fields["data"], active)
+
         rows = self.mysql.session.query(
             nandy.store.mysql.Chore
         ).filter_by(
@@ -424,7 +1253,7 @@ class NandyData(object):
         ).update(
             fields
         )
-        self.mysql.session.commit()
+        self.commit()
         return rows
 
     def chore_check(self, chore):
@@ -433,26 +1262,24 @@ class NandyData(object):
         If not completes the task
         """
 
-        if "tasks" not in chore.data:
-            return
-
-        # Go through all the tasks
+        tasks = self.tasks(chore)
 
-        for task in chore.data["tasks"]:
+        if tasks is None:
+            return
 
-            # If there's one that's start and not completed, we're good
+        # If there's one that's start and not completed, we're good
 
-            if "start" in task and "end" not in task:
-                return
+        if self.active(chore) is not None:
+            return
 
-        # Go through the tasks again now that we know none are in progress
+        # Go through the tasks now that we know none are in progress
 
-        for task in chore.data["tasks"]:
+        for task in tasks:
 
             # If not start, start it, and let 'em know
 
             if "start" not in task:
-                task["start"] = time.time()
+                task["start"] = self.now()
 
                 if "paused" in task and task["paused"]:
                     self.speak_task(f"you do not have to {task['text']} yet", task, chore)
@@ -471,13 +1298,13 @@ class NandyData(object):
         with a button press.  
         """
 
-        # Go through all the tasks, complete the first one found
-        # that's ongoing and break
+        # Complete the first one that's ongoing
 
-        for task in chore.data["tasks"]:
-            if "start" in task and "end" not in task:
-                self.task_complete(task, chore)
-                return True
+        task = self.active(chore)
+
+        if task is not None:
+            self.task_complete(task, chore)
+            return True
 
         return False
 
@@ -492,7 +1319,7 @@ class NandyData(object):
 
             chore.data["paused"] = True
             self.speak_chore(f"you do not have to {chore.data['text']} yet", chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -509,7 +1336,7 @@ class NandyData(object):
 
             chore.data["paused"] = False
             self.speak_chore(f"you do have to {chore.data['text']} now", chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -525,11 +1352,11 @@ class NandyData(object):
         if "skipped" not in chore.data or not chore.data["skipped"]:
 
             chore.data["skipped"] = True
-            chore.data["end"] = time.time()
+            chore.data["end"] = self.now()
             chore.status = "ended"
                 
             self.speak_chore(f"you do not have to {chore.data['text']}", chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -549,7 +1376,7 @@ class NandyData(object):
             chore.status = "started"
 
             self.speak_chore(f"you do have to {chore.data['text']}", chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -562,10 +1389,10 @@ class NandyData(object):
 
         if "end" not in chore.data or chore.status != "ended":
 
-            chore.data["end"] = time.time()
+            chore.data["end"] = self.now()
             chore.status = "ended"
             self.speak_chore(f"thank you. You did {chore.data['text']}", chore)
-            self.mysql.session.commit()
+            self.commit()
             self.graphite.send("person", chore.person.name, "chore", chore.data["text"], "duration", chore.data["end"] - chore.data["start"], chore.data["start"])
 
             return True
@@ -582,7 +1409,7 @@ class NandyData(object):
             del chore.data["end"]
             chore.status = "started"
             self.speak_chore(f"I'm sorry but you did not {chore.data['text']} yet", chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
         
@@ -594,7 +1421,7 @@ class NandyData(object):
         """
 
         rows = self.mysql.session.query(nandy.store.mysql.Chore).filter_by(chore_id=chore_id).delete()
-        self.mysql.session.commit()
+        self.commit()
         return rows
 
     # Task
@@ -610,7 +1437,7 @@ class NandyData(object):
 
             task["paused"] = True
             self.speak_task(f"you do not have to {task['text']} yet", task, chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -627,7 +1454,7 @@ class NandyData(object):
 
             task["paused"] = False
             self.speak_task(f"you do have to {task['text']} now", task, chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -643,7 +1470,7 @@ class NandyData(object):
         if "skipped" not in task or not task["skipped"]:
 
             task["skipped"] = True
-            task["end"] = time.time()
+            task["end"] = self.now()
 
             # If it hasn't been started, do so now
 
@@ -655,7 +1482,7 @@ class NandyData(object):
             # Check to see if there's another one and set
 
             self.chore_check(chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -683,7 +1510,7 @@ class NandyData(object):
 
             # Save
 
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -698,7 +1525,7 @@ class NandyData(object):
 
         if "end" not in task:
 
-            task["end"] = time.time()
+            task["end"] = self.now()
 
             # If it hasn't been started, do so now
 
@@ -711,7 +1538,7 @@ class NandyData(object):
             # See if there's a next one, save our changes
 
             self.chore_check(chore)
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -739,7 +1566,7 @@ class NandyData(object):
 
             # Don't check because we know one is started. But set out changes.
 
-            self.mysql.session.commit()
+            self.commit()
 
             return True
 
@@ -747,9 +1574,9 @@ class NandyData(object):
 
     # Act
 
-    def act_create(self, fields=None, template=None):
+    def act_fields(self, fields=None, template=None):
         """
-        Creates an act from a template
+        Fills out the fields of an act to create from a template
         """
 
         if template is None:
@@ -758,7 +1585,7 @@ class NandyData(object):
         if fields is None:
             fields = {}
 
-        fields["created"] = time.time()
+        fields["created"] = self.now()
 
         if "data" not in fields and template:
             fields["data"] = copy.deepcopy(template)
@@ -767,17 +1594,30 @@ class NandyData(object):
             fields["name"] = template["name"]
 
         if "person" in template and "person_id" not in fields:
-            fields["person_id"] = self.mysql.session.query(nandy.store.mysql.Person).filter_by(name=template["person"]).one().person_id
+            fields["person_id"] = self.person_id(template["person"])
 
         if "value" in template and "value" not in fields:
             fields["value"] = template["value"]
 
+        return fields
+
+    def act_create(self, fields=None, template=None):
+        """
+        Creates an act from a template
+        """
+
+        if template is None:
+            template = {}
+
+        fields = self.act_fields(fields, template)
+
         act = nandy.store.mysql.Act(**fields)
 
         # Save it
 
         self.mysql.session.add(act)
-        self.mysql.session.commit()
+        self.mysql.session.flush()
+        self.commit()
         self.graphite.send("person", act.person.name, "act", act.name, 1 if act.value == "positive" else -1, act.created)
 
         # Check to see if we should fire off a chore
@@ -787,22 +1627,82 @@ class NandyData(object):
 
         return act
 
-    def act_list(self, filter=None):
+    def act_create_many(self, creates):
         """
-        Lists Acts based on filter
+        Creates many acts at once, each create being the fields 
+        and/or template act_create would take, returned in order
         """
 
-        if filter is None:
-            filter = {}
+        creates = [(create.get("fields"), create.get("template") or {}) for create in creates]
 
-        return self.mysql.session.query(
-            nandy.store.mysql.Act
-        ).filter_by(
-            **filter
-        ).order_by(
-            nandy.store.mysql.Act.created.desc()
+        # Look up everyone at once
+
+        self.person_ids(set(
+            template["person"] for fields, template in creates if "person" in template
+        ))
+
+        with self.transaction():
+
+            acts = [
+                nandy.store.mysql.Act(**self.act_fields(fields, template))
+                for fields, template in creates
+            ]
+
+            self.mysql.session.add_all(acts)
+            self.mysql.session.flush()
+
+            chores = []
+
+            for act, (fields, template) in zip(acts, creates):
+
+                self.graphite.send("person", act.person.name, "act", act.name, 1 if act.value == "positive" else -1, act.created)
+
+                # Check to see if we should fire off a chore
+
+                if "chore" in template and act.value == "negative":
+                    chores.append({"fields": {"person_id": act.person_id}, "template": template["chore"]})
+
+            if chores:
+                self.chore_create_many(chores)
+
+        return acts
+
+    def act_list(self, filter=None, limit=None, cursor=None, fields=None, order=None):
+        """
+        Lists Acts based on filter (see filters), ordered by order (see
+        ordering), newest first by default. Pages with limit, cursor being the last
+        Act of the previous page. With fields, rows of just those plus the
+        order columns.
+        """
+
+        return self.page(
+            self.query(
+                nandy.store.mysql.Act,
+                fields
+            ).filter(
+                *self.filters(nandy.store.mysql.Act, filter)
+            ),
+            *self.ordering(nandy.store.mysql.Act, order or ["-created"]),
+            cursor=cursor,
+            limit=limit
         ).all()
 
+    def act_stream(self, filter=None, size=100, fields=None, order=None):
+        """
+        Yields every Act like act_list, size at a time
+        """
+
+        return self.stream(
+            self.query(
+                nandy.store.mysql.Act,
+                fields
+            ).filter(
+                *self.filters(nandy.store.mysql.Act, filter)
+            ),
+            *self.ordering(nandy.store.mysql.Act, order or ["-created"]),
+            size=size
+        )
+
     def act_retrieve(self, act_id):
         """
         Retrieves Act based on id
@@ -826,7 +1726,7 @@ class NandyData(object):
         ).update(
             fields
         )
-        self.mysql.session.commit()
+        self.commit()
         return rows
 
     def act_delete(self, act_id):
@@ -839,5 +1739,111 @@ class NandyData(object):
         ).filter_by(
             act_id=act_id
         ).delete()
-        self.mysql.session.commit()
-        return rows
\ No newline at end of file
+        self.commit()
+        return rows
+
+
+class AsyncNandyData(object):
+    """
+    Coroutine version of NandyData for asyncio callers. Calls run on a bounded
+    pool of threads, each with its own NandyData, all sharing one engine. Each
+    call gets a fresh session so concurrent requests never share one.
+
+    Given a MySQL it's used as is, otherwise one's made from url, host and
+    port and the pool settings, see nandy.store.mysql.MySQL, sized to workers.
+    The rest go to every thread's NandyData.
+    """
+
+    OPERATIONS = NandyData.OPERATIONS
+
+    def __init__(
+        self, workers=4, cache=None, clock=None, mysql=None, url=None, host=None, port=None,
+        max_overflow=None, pool_recycle=None, pool_pre_ping=None,
+        person_ttl=60, graphite=None, instrument=None, task_table=False
+    ):
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.local = threading.local()
+
+        self.mysql = mysql or nandy.store.mysql.MySQL(
+            host=host,
+            port=port,
+            url=url,
+            pool_size=workers,
+            max_overflow=max_overflow,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=pool_pre_ping
+        )
+
+        # Objects outlive each call's session, so keep what's loaded
+
+        self.mysql.Session.configure(expire_on_commit=False)
+
+        # One cache, graphite and instrument for all the threads, they're
+        # all safe to share
+
+        self.cache = cache
+        self.clock = clock
+        self.person_ttl = person_ttl
+        self.graphite = graphite
+        self.instrument = instrument
+        self.task_table = task_table
+
+    def data(self):
+        """
+        Gets this thread's NandyData, creating it if needed
+        """
+
+        if not hasattr(self.local, "data"):
+            self.local.data = NandyData(
+                self.mysql,
+                person_ttl=self.person_ttl,
+                graphite=self.graphite,
+                instrument=self.instrument,
+                cache=self.cache,
+                task_table=self.task_table,
+                clock=self.clock
+            )
+
+        return self.local.data
+
+    def call(self, name, *args, **kwargs):
+        """
+        Runs a NandyData method in a session of its own
+        """
+
+        data = self.data()
+
+        with self.mysql.scope() as session:
+
+            # Objects from earlier calls come back detached, so attach them here
+
+            for arg in args:
+                if isinstance(arg, nandy.store.mysql.Base):
+                    session.add(arg)
+
+            return getattr(data, name)(*args, **kwargs)
+
+    def __getattr__(self, name):
+
+        # Streams are lazy, so they'd outlive the call's session
+
+        if not name.startswith(self.OPERATIONS) or name.endswith("_stream") or not hasattr(NandyData, name):
+            raise AttributeError(name)
+
+        async def operation(*args, **kwargs):
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor, 
+                functools.partial(self.call, name, *args, **kwargs)
+            )
+
+        operation.__name__ = name
+
+        return operation
+
+    def close(self):
+        """
+        Waits for running calls and shuts down the threads
+        """
+
+        self.executor.shutdown()
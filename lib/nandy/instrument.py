@@ -0,0 +1,190 @@
+"""
+Module for timing and counting what NandyData does
+"""
+
+import time
+import logging
+import collections
+import threading
+import functools
+import contextlib
+
+import sqlalchemy
+import sqlalchemy.event
+
+
+class MemorySink(object):
+    """
+    Keeps the latest size records, and running totals per name
+    """
+
+    def __init__(self, size=1000):
+
+        self.records = collections.deque(maxlen=size)
+        self.totals = {}
+
+    def record(self, name, duration, queries):
+
+        self.records.append({
+            "name": name,
+            "duration": duration,
+            "queries": queries
+        })
+
+        if name not in self.totals:
+            self.totals[name] = {"calls": 0, "duration": 0, "queries": 0}
+
+        self.totals[name]["calls"] += 1
+        self.totals[name]["duration"] += duration
+        self.totals[name]["queries"] += queries
+
+
+class LogSink(object):
+    """
+    Logs every record
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+
+        self.logger = logger or logging.getLogger("nandy")
+        self.level = level
+
+    def record(self, name, duration, queries):
+
+        self.logger.log(self.level, "%s took %.6fs and %d queries", name, duration, queries)
+
+
+class GraphiteSink(object):
+    """
+    Sends every record to a Graphite (or Metrics)
+    """
+
+    def __init__(self, graphite):
+
+        self.graphite = graphite
+
+    def record(self, name, duration, queries):
+
+        now = time.time()
+
+        self.graphite.send("instrument", name, "duration", duration, now)
+        self.graphite.send("instrument", name, "queries", queries, now)
+
+
+class Instrument(object):
+    """
+    Times NandyData's operations and its store calls, counting the
+    queries each one makes, and hands the results to a sink
+    """
+
+    def __init__(self, sink=None):
+
+        self.sink = sink or MemorySink()
+        self.local = threading.local()
+
+    def stack(self):
+        """
+        This thread's measurements in progress
+        """
+
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+
+        return self.local.stack
+
+    def record(self, name, duration, queries):
+        """
+        Passes to the sink, ignoring anything the sink itself does
+        """
+
+        if getattr(self.local, "recording", False):
+            return
+
+        self.local.recording = True
+
+        try:
+            self.sink.record(name, duration, queries)
+        finally:
+            self.local.recording = False
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """
+        Times everything inside, counting queries
+        """
+
+        frame = {"queries": 0}
+        self.stack().append(frame)
+        start = time.perf_counter()
+
+        try:
+            yield frame
+        finally:
+            duration = time.perf_counter() - start
+            self.stack().pop()
+            self.record(name, duration, frame["queries"])
+
+    def wrap(self, name, function):
+        """
+        Wraps a function to be measured each call
+        """
+
+        @functools.wraps(function)
+        def wrapped(*args, **kwargs):
+
+            if getattr(self.local, "recording", False):
+                return function(*args, **kwargs)
+
+            with self.measure(name):
+                return function(*args, **kwargs)
+
+        wrapped.instrument = self
+
+        return wrapped
+
+    def before_query(self, conn, cursor, statement, parameters, context, executemany):
+
+        for frame in self.stack():
+            frame["queries"] += 1
+
+        conn.info.setdefault("instrument", []).append(time.perf_counter())
+
+    def after_query(self, conn, cursor, statement, parameters, context, executemany):
+
+        self.record("mysql.query", time.perf_counter() - conn.info["instrument"].pop(), 1)
+
+    def attach(self, data):
+        """
+        Instruments a NandyData's operations, its channels, graphite and engine
+        """
+
+        # Just what callers call, the helpers underneath would only add
+        # overhead, and streams return before doing anything
+
+        for name in dir(type(data)):
+            if name.startswith(type(data).OPERATIONS) and not name.endswith("_stream") and callable(getattr(type(data), name)):
+                setattr(data, name, self.wrap(name, getattr(data, name)))
+
+        for store, method in [
+            ("speech", "publish"),
+            ("speech", "flush"),
+            ("event", "publish"),
+            ("event", "flush"),
+            ("graphite", "send"),
+            ("graphite", "flush")
+        ]:
+
+            # Graphite can be shared, so it may be wrapped already
+
+            function = getattr(getattr(data, store), method)
+
+            if getattr(function, "instrument", None) is not self:
+                setattr(getattr(data, store), method, self.wrap(f"{store}.{method}", function))
+
+        # Just the once per engine, it's shared by every NandyData on a MySQL
+
+        if not sqlalchemy.event.contains(data.mysql.engine, "before_cursor_execute", self.before_query):
+            sqlalchemy.event.listen(data.mysql.engine, "before_cursor_execute", self.before_query)
+            sqlalchemy.event.listen(data.mysql.engine, "after_cursor_execute", self.after_query)
+
+        return data
@@ -0,0 +1,91 @@
+"""
+Main module for caching Nandy data in process
+"""
+
+import os
+import threading
+import collections
+
+import redis
+
+
+class Cache(object):
+    """
+    LRU of values by namespace and key. Each namespace has a version, and
+    clearing bumps it, making everything cached under the old one stale.
+    Shared, the versions live in Redis so clearing in one process clears
+    them all, at the cost of a Redis GET per lookup.
+    """
+
+    def __init__(self, size=1024, shared=False, host=None, port=None, prefix=None):
+
+        self.size = size
+        self.prefix = prefix or "nandy"
+
+        self.redis = None
+
+        if shared:
+            self.redis = redis.StrictRedis(host=host or os.environ["REDIS_HOST"], port=port or int(os.environ["REDIS_PORT"]))
+
+        self.entries = collections.OrderedDict()
+        self.versions = {}
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, namespace):
+        """
+        Current version of a namespace
+        """
+
+        if self.redis is not None:
+            return int(self.redis.get(f"{self.prefix}/cache/{namespace}") or 0)
+
+        return self.versions.get(namespace, 0)
+
+    def fetch(self, namespace, key, load):
+        """
+        Returns what's cached, or what load returns, caching that. The version's
+        read before loading so a clear while loading isn't lost.
+        """
+
+        version = self.version(namespace)
+
+        with self.lock:
+
+            entry = self.entries.get((namespace, key))
+
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end((namespace, key))
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+
+        value = load()
+
+        with self.lock:
+
+            self.entries[(namespace, key)] = (version, value)
+            self.entries.move_to_end((namespace, key))
+
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+        return value
+
+    def clear(self, namespace):
+        """
+        Makes everything cached in a namespace stale, everywhere if shared
+        """
+
+        if self.redis is not None:
+            self.redis.incr(f"{self.prefix}/cache/{namespace}")
+
+        with self.lock:
+
+            self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+            for key in [key for key in self.entries if key[0] == namespace]:
+                del self.entries[key]
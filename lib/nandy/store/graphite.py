@@ -1,19 +1,205 @@
 import os 
 import re
+import json
+import logging
+import threading
+import functools
+import contextlib
 
 import graphyte
 
 SANITIZE = re.compile(r'\W+')
 
+# Most metrics sent per socket write, same as graphyte
+
+BATCH = 1000
+
+@functools.lru_cache(maxsize=1024)
+def sanitize(segment):
+    """
+    Makes a path segment safe, remembering the ones we've seen
+    """
+
+    return SANITIZE.sub('_', segment)
+
 class Graphite(object):
 
-    def __init__(self, host=None, port=None, prefix=None):
+    def __init__(self, host=None, port=None, prefix=None, interval=None, size=None):
 
         self.sender = graphyte.Sender(host or os.environ["GRAPHITE_HOST"], port=port or int(os.environ["GRAPHITE_PORT"]), prefix=prefix or "nandy")
 
+        # Batches are per thread, the queue's shared
+
+        self.local = threading.local()
+        self.queue = []
+        self.lock = threading.Lock()
+
+        # Over size queued, metrics are dropped rather than held
+
+        self.size = size
+        self.sent = 0
+        self.dropped = 0
+        self.flushed = 0
+
+        # With an interval, a background thread does all the sending
+
+        self.interval = interval
+
+        if interval is None and os.environ.get("GRAPHITE_INTERVAL"):
+            self.interval = float(os.environ["GRAPHITE_INTERVAL"])
+
+        self.logger = logging.getLogger("nandy")
+        self.stopping = threading.Event()
+        self.thread = None
+
+        if self.interval:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    @property
+    def batching(self):
+        """
+        How many batches this thread's in
+        """
+
+        return getattr(self.local, "batching", 0)
+
+    @batching.setter
+    def batching(self, value):
+
+        self.local.batching = value
+
+    @property
+    def held(self):
+        """
+        What this thread's batched up to send
+        """
+
+        if not hasattr(self.local, "held"):
+            self.local.held = []
+
+        return self.local.held
+
+    @held.setter
+    def held(self, value):
+
+        self.local.held = value
+
     def send(self, *args):
 
-        self.sender.send(".".join([SANITIZE.sub('_', arg) for arg in args[:-2]]), args[-2], args[-1])
+        metric = (".".join([sanitize(arg) for arg in args[:-2]]), args[-2], args[-1])
+
+        if not self.batching and not self.interval:
+            self.sender.send(*metric)
+            self.sent += 1
+            self.flushed += 1
+            return
+
+        # Built now so bad values fail here for the caller, not later in a flush
+
+        message = self.sender.build_message(*metric)
+
+        # Batched, it's held till the batch is done, or dropped if it fails
+
+        if self.batching:
+            self.held.append(message)
+            return
+
+        self.enqueue([message])
+
+    def enqueue(self, messages):
+        """
+        Queues built messages for the next flush, dropping what doesn't fit
+        """
+
+        with self.lock:
+
+            for message in messages:
+
+                if self.size and len(self.queue) >= self.size:
+                    self.dropped += 1
+                    continue
+
+                self.queue.append(message)
+                self.sent += 1
+
+    def flush(self):
+        """
+        Sends all queued metrics in as few writes as we can
+        """
+
+        with self.lock:
+            queue, self.queue = self.queue, []
+
+        for start in range(0, len(queue), BATCH):
+
+            # Whatever didn't make it is lost
+
+            try:
+                self.sender.send_socket(b"".join(queue[start:start + BATCH]))
+            except Exception:
+                self.dropped += len(queue) - start
+                raise
+
+            self.flushed += 1
+
+    def run(self):
+        """
+        Background loop that flushes every interval until stopped, carrying
+        on past failures so metrics don't pile up with no one sending them
+        """
+
+        while True:
+
+            stopping = self.stopping.wait(self.interval)
+
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception("graphite flush failed")
+
+            if stopping:
+                break
+
+    def stop(self):
+        """
+        Stops the background thread, sending whatever's left
+        """
+
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+        self.interval = None
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Holds everything sent inside and sends it all at the end, or leaves
+        it to the background thread if there is one. If what's inside fails,
+        nothing held is sent.
+        """
+
+        self.batching += 1
+
+        try:
+            yield self
+        except Exception:
+            self.batching -= 1
+            if not self.batching:
+                self.held = []
+            raise
+
+        self.batching -= 1
+
+        if not self.batching:
+
+            held, self.held = self.held, []
+            self.enqueue(held)
+
+            if not self.interval:
+                self.flush()
 
 class MockGraphyteSender(object):
 
@@ -24,12 +210,38 @@ class MockGraphyteSender(object):
         self.prefix = prefix
 
         self.messages = []
+        self.sockets = 0
 
     def send(self, name, value, timestamp):
 
+        self.build_message(name, value, timestamp)
+
+        self.sockets += 1
         self.messages.append({
             "name": name,
             "value": value,
             "timestamp": timestamp
         })
 
+    def build_message(self, name, value, timestamp):
+
+        # Same checks as graphyte
+
+        if not name or name.split(None, 1)[0] != name:
+            raise ValueError('"metric" must not have whitespace in it')
+
+        if not isinstance(value, (int, float)):
+            raise TypeError(f'"value" must be an int or a float, not a {type(value).__name__}')
+
+        return json.dumps({
+            "name": name,
+            "value": value,
+            "timestamp": timestamp
+        }).encode("utf-8") + b"\n"
+
+    def send_socket(self, message):
+
+        self.sockets += 1
+
+        for line in message.splitlines():
+            self.messages.append(json.loads(line))
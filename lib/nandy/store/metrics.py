@@ -0,0 +1,273 @@
+"""
+Main module for aggregating Nandy metrics in process
+"""
+
+import time
+import logging
+import threading
+import contextlib
+import socketserver
+import http.server
+
+import nandy.store.graphite
+
+# Upper bounds of the histogram buckets, in seconds for durations
+
+BUCKETS = (1, 10, 60, 300, 900, 1800, 3600, 7200)
+
+class Series(object):
+    """
+    Running count, sum, min, max, last value and buckets of one metric
+    """
+
+    def __init__(self, buckets=BUCKETS):
+
+        self.buckets = buckets
+
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.counts = [0] * len(buckets)
+
+    def add(self, value):
+
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+
+
+class Metrics(object):
+    """
+    Takes the same sends as Graphite, but adds them up in process. Every interval
+    (or flush) it sends one set of stats per metric to graphite, and serve()
+    exposes the running totals for scraping.
+    """
+
+    STATS = ("count", "sum", "min", "max", "last")
+
+    def __init__(self, graphite=None, interval=None, prefix=None, buckets=BUCKETS):
+
+        self.graphite = graphite
+        self.prefix = prefix or "nandy"
+        self.buckets = buckets
+
+        # Stats since the last flush, and since we started
+
+        self.series = {}
+        self.totals = {}
+        self.lock = threading.Lock()
+
+        self.sent = 0
+        self.flushed = 0
+
+        # Sends inside a batch wait for it to finish, each thread's batch
+        # its own
+
+        self.local = threading.local()
+
+        self.interval = interval
+        self.logger = logging.getLogger("nandy")
+        self.stopping = threading.Event()
+        self.thread = None
+        self.server = None
+
+        if interval:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    @property
+    def batching(self):
+        """
+        How many batches this thread's in
+        """
+
+        return getattr(self.local, "batching", 0)
+
+    @batching.setter
+    def batching(self, value):
+
+        self.local.batching = value
+
+    @property
+    def held(self):
+        """
+        What this thread's batched up to add
+        """
+
+        if not hasattr(self.local, "held"):
+            self.local.held = []
+
+        return self.local.held
+
+    @held.setter
+    def held(self, value):
+
+        self.local.held = value
+
+    def send(self, *args):
+        """
+        Adds a value to a metric, same arguments as Graphite.send. The
+        timestamp is ignored as stats go out at flush time.
+        """
+
+        if self.batching:
+            self.held.append(args)
+            return
+
+        path = tuple(nandy.store.graphite.sanitize(arg) for arg in args[:-2])
+
+        with self.lock:
+
+            for series in (self.series, self.totals):
+                if path not in series:
+                    series[path] = Series(self.buckets)
+                series[path].add(args[-2])
+
+            self.sent += 1
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Adds up everything sent inside at the end, or none of it if what's
+        inside fails
+        """
+
+        self.batching += 1
+
+        try:
+            yield self
+        except Exception:
+            self.batching -= 1
+            if not self.batching:
+                self.held = []
+            raise
+
+        self.batching -= 1
+
+        if not self.batching:
+
+            held, self.held = self.held, []
+
+            for args in held:
+                self.send(*args)
+
+    def flush(self):
+        """
+        Sends the stats since the last flush to graphite
+        """
+
+        with self.lock:
+            series, self.series = self.series, {}
+
+        if self.graphite is None or not series:
+            return
+
+        timestamp = time.time()
+
+        with self.graphite.batch():
+            for path, stats in series.items():
+                for stat in self.STATS:
+                    self.graphite.send(*path, stat, getattr(stats, stat), timestamp)
+
+        self.flushed += 1
+
+    def run(self):
+        """
+        Background loop that flushes every interval until stopped, carrying
+        on past failures so there's still someone sending
+        """
+
+        while True:
+
+            stopping = self.stopping.wait(self.interval)
+
+            # What failed to go out is lost, it's already out of series
+
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception("metrics flush failed")
+
+            if stopping:
+                break
+
+    def stop(self):
+        """
+        Stops the background thread and server, flushing whatever's left
+        """
+
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        self.interval = None
+
+    def scrape(self):
+        """
+        Running totals in the Prometheus text format
+        """
+
+        lines = []
+
+        with self.lock:
+
+            for path, stats in sorted(self.totals.items()):
+
+                name = "_".join((self.prefix,) + path)
+
+                lines.append(f"# TYPE {name} histogram")
+
+                for bucket, count in zip(self.buckets, stats.counts):
+                    lines.append(f'{name}_bucket{{le="{bucket}"}} {count}')
+
+                lines.append(f'{name}_bucket{{le="+Inf"}} {stats.count}')
+                lines.append(f"{name}_sum {stats.sum}")
+                lines.append(f"{name}_count {stats.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host=""):
+        """
+        Serves scrape() over HTTP from a background thread
+        """
+
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+
+                body = metrics.scrape().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+
+                pass
+
+        class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+
+            daemon_threads = True
+
+        self.server = Server((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return self.server
@@ -1,23 +1,378 @@
 import os
+import json
+import threading
+import contextlib
+import collections.abc
 
+import msgpack
 import pymysql
 import sqlalchemy
+import sqlalchemy.pool
+import sqlalchemy.event
+import sqlalchemy.engine.url
 import sqlalchemy.orm
+import sqlalchemy.orm.attributes
 import sqlalchemy.ext.declarative
 import sqlalchemy.ext.mutable
 import flask_jsontools
-import sqlalchemy_jsonfield
+
+def database_url(host=None, port=None, url=None):
+    """
+    Figures out what to connect to. MYSQL_URL in the environment can be any
+    SQLAlchemy URL, like sqlite:///nandy.db or sqlite:// for in memory, but
+    an explicit host or port still means MySQL
+    """
+
+    if url is None and host is None and port is None:
+        url = os.environ.get("MYSQL_URL")
+
+    return url or f"mysql+pymysql://root@{host or os.environ['MYSQL_HOST']}:{port or os.environ['MYSQL_PORT']}/nandy"
+
+
+def foreign_keys(connection, record):
+    """
+    SQLite only enforces foreign keys if asked, like MySQL does
+    """
+
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
 
 class MySQL(object):
     """
     Main class for interacting with Nandy in MySQL
     """
 
-    def __init__(self, host=None, port=None):
+    def __init__(self, host=None, port=None, pool_size=None, max_overflow=None, pool_recycle=None, pool_pre_ping=None, expire_on_commit=True, url=None):
+
+        url = sqlalchemy.engine.url.make_url(database_url(host, port, url))
+
+        # Only pass pool settings we were given, leaving SQLAlchemy's defaults otherwise
+
+        pool = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_recycle": pool_recycle,
+            "pool_pre_ping": pool_pre_ping
+        }
+
+        options = {name: value for name, value in pool.items() if value is not None}
+
+        if url.drivername.startswith("sqlite"):
+
+            # SQLite pools aren't sized
+
+            options.pop("pool_size", None)
+            options.pop("max_overflow", None)
+
+            # In memory, every thread has to share the one connection or they'd
+            # each get their own empty database
+
+            if not url.database or url.database == ":memory:":
+                options["poolclass"] = sqlalchemy.pool.StaticPool
+                options["connect_args"] = {"check_same_thread": False}
+
+        self.engine = sqlalchemy.create_engine(url, **options)
+
+        if url.drivername.startswith("sqlite"):
+            sqlalchemy.event.listen(self.engine, "connect", foreign_keys)
+
+        # Each thread gets its own session, all sharing the engine's pool
+
+        self.Session = sqlalchemy.orm.sessionmaker(bind=self.engine, expire_on_commit=expire_on_commit)
+        self.session = sqlalchemy.orm.scoped_session(self.Session)
+
+        # Person name to (id, expires), shared by every NandyData using this
+        # so they all forget together, see NandyData.person_ids
+
+        self.persons = {}
+        self.persons_lock = threading.Lock()
+
+        # What keeps chores scheduled as they're saved, NandyData.schedule of
+        # the first NandyData using this
+
+        self.scheduler = None
+        sqlalchemy.event.listen(self.session, "before_flush", self.before_flush)
+
+    def before_flush(self, session, context, instances):
+        """
+        Has the scheduler, if there is one, look over what's being saved
+        """
+
+        if self.scheduler is not None:
+            self.scheduler(session, context, instances)
+
+    @contextlib.contextmanager
+    def scope(self):
+        """
+        Gives this thread a fresh session for the duration, discarding it after
+        """
+
+        try:
+            yield self.session
+        finally:
+            self.session.remove()
+
+
+class DataField(sqlalchemy.types.TypeDecorator):
+    """
+    Stores a data dict as "json", "compact" json or "msgpack". Reads all 
+    of them back whatever the setting, so rows switch over as they're saved.
+    The msgpack codec is binary and needs a BLOB column.
+    """
+
+    impl = sqlalchemy.UnicodeText
+
+    CODECS = ("json", "compact", "msgpack")
+
+    def __init__(self, codec="json"):
+
+        if codec not in self.CODECS:
+            raise ValueError(f"unknown codec {codec}")
+
+        self.codec = codec
+        super(DataField, self).__init__()
+
+    def load_dialect_impl(self, dialect):
+
+        if self.codec == "msgpack":
+            return dialect.type_descriptor(sqlalchemy.LargeBinary())
+
+        return dialect.type_descriptor(sqlalchemy.UnicodeText())
+
+    def process_bind_param(self, value, dialect):
+
+        if value is None:
+            return None
+
+        if self.codec == "msgpack":
+            return msgpack.packb(value, use_bin_type=True)
+
+        if self.codec == "compact":
+            return json.dumps(value, separators=(',', ':'))
+
+        return json.dumps(value)
+
+    def process_result_value(self, value, dialect):
+
+        if value is None:
+            return None
+
+        # JSON always starts with a brace, a msgpack map never does
+
+        if isinstance(value, bytes):
+
+            if value[:1] != b"{":
+                return msgpack.unpackb(value, raw=False)
+
+            value = value.decode("utf-8")
+
+        return json.loads(value)
+
+
+def track(value, parent):
+    """
+    Wraps nested dicts and lists so their changes reach the parent. Only for
+    what's loaded, what's set is stored as given, see same.
+    """
+
+    if isinstance(value, (TrackedDict, TrackedList)) and value.parent is parent:
+        return value
+
+    if isinstance(value, dict):
+        return TrackedDict(value, parent)
+
+    if isinstance(value, list):
+        return TrackedList(value, parent)
+
+    return value
+
+
+def same(container, key, value):
+    """
+    Whether setting key to value wouldn't change anything. Only for plain
+    values, a dict or list is always stored as given, like MutableDict does,
+    so changes the caller makes to it after still get saved.
+    """
+
+    return not isinstance(value, (dict, list)) and key in container and dict.__getitem__(container, key) == value
+
+
+class TrackedDict(dict):
+    """
+    Dict inside a MutableData that tells its parent when it changes
+    """
+
+    def __init__(self, value, parent):
+
+        self.parent = parent
+        dict.__init__(self, ((key, track(item, self)) for key, item in value.items()))
+
+    def changed(self):
+
+        self.parent.changed()
+
+    def __setitem__(self, key, value):
+
+        # Setting the same value isn't a change
+
+        if same(self, key, value):
+            return
+
+        dict.__setitem__(self, key, value)
+        self.changed()
+
+    def __delitem__(self, key):
+
+        dict.__delitem__(self, key)
+        self.changed()
+
+    def setdefault(self, key, value=None):
+
+        if key not in self:
+            self[key] = value
+
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, *args):
+
+        result = dict.pop(self, *args)
+        self.changed()
+        return result
+
+    def popitem(self):
+
+        result = dict.popitem(self)
+        self.changed()
+        return result
+
+    def clear(self):
+
+        dict.clear(self)
+        self.changed()
+
+    def __reduce_ex__(self, protocol):
+
+        # Copies and pickles come out plain, not tied to the original
+
+        return (dict, (dict(self),))
+
+
+class TrackedList(list):
+    """
+    List inside a MutableData that tells its parent when it changes
+    """
+
+    def __init__(self, value, parent):
+
+        self.parent = parent
+        list.__init__(self, (track(item, self) for item in value))
+
+    def changed(self):
+
+        self.parent.changed()
+
+    def __setitem__(self, index, value):
+
+        list.__setitem__(self, index, value)
+
+        self.changed()
+
+    def __delitem__(self, index):
+
+        list.__delitem__(self, index)
+        self.changed()
+
+    def __iadd__(self, value):
+
+        self.extend(value)
+        return self
+
+    def append(self, value):
+
+        list.append(self, value)
+        self.changed()
+
+    def extend(self, value):
+
+        list.extend(self, value)
+        self.changed()
+
+    def insert(self, index, value):
+
+        list.insert(self, index, value)
+        self.changed()
+
+    def pop(self, *args):
+
+        result = list.pop(self, *args)
+        self.changed()
+        return result
+
+    def remove(self, value):
+
+        list.remove(self, value)
+        self.changed()
 
-        self.engine = sqlalchemy.create_engine(f"mysql+pymysql://root@{host or os.environ['MYSQL_HOST']}:{port or os.environ['MYSQL_PORT']}/nandy")
-        Session = sqlalchemy.orm.sessionmaker(bind=self.engine)
-        self.session = Session()
+    def clear(self):
+
+        list.clear(self)
+        self.changed()
+
+    def sort(self, *args, **kwargs):
+
+        list.sort(self, *args, **kwargs)
+        self.changed()
+
+    def reverse(self):
+
+        list.reverse(self)
+        self.changed()
+
+    def __reduce_ex__(self, protocol):
+
+        return (list, (list(self),))
+
+
+class MutableData(sqlalchemy.ext.mutable.MutableDict):
+    """
+    MutableDict that also tracks changes inside nested dicts and lists, like
+    a chore's tasks, and ignores setting a key to the plain value it already
+    has. Dicts and lists set are stored as given and tracked once reloaded.
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        super(MutableData, self).__init__(*args, **kwargs)
+
+        for key, value in dict.items(self):
+            dict.__setitem__(self, key, track(value, self))
+
+    def __setitem__(self, key, value):
+
+        if same(self, key, value):
+            return
+
+        dict.__setitem__(self, key, value)
+        self.changed()
+
+    def setdefault(self, key, value=None):
+
+        if key not in self:
+            self[key] = value
+
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
 
 
 Base = sqlalchemy.ext.declarative.declarative_base(cls=(flask_jsontools.JsonSerializableBase))
@@ -31,8 +386,10 @@ class Person(Base):
     name = sqlalchemy.Column(sqlalchemy.String(64), nullable=False)
     email = sqlalchemy.Column(sqlalchemy.String(128), nullable=False)
 
-    sqlalchemy.schema.UniqueConstraint('name', name='label')
-    sqlalchemy.schema.UniqueConstraint('email', name='email')
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint('name', name='label'),
+        sqlalchemy.UniqueConstraint('email', name='email'),
+    )
 
     def __repr__(self):
         return "<Person(name='%s')>" % (self.name)
@@ -48,13 +405,15 @@ class Area(Base):
     status = sqlalchemy.Column(sqlalchemy.String(32), nullable=False)
     updated = sqlalchemy.Column(sqlalchemy.Integer)
     data = sqlalchemy.Column(
-        sqlalchemy.ext.mutable.MutableDict.as_mutable(
-            sqlalchemy_jsonfield.JSONField(enforce_string=True,enforce_unicode=False)
+        MutableData.as_mutable(
+            DataField("json")
         ), 
         nullable=False
     )
 
-    sqlalchemy.schema.UniqueConstraint('name', name='label')
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint('name', name='label'),
+    )
 
     def __repr__(self):
         return "<Area(name='%s')>" % (self.name)
@@ -68,13 +427,15 @@ class Template(Base):
     name = sqlalchemy.Column(sqlalchemy.String(128), nullable=False)
     kind = sqlalchemy.Column(sqlalchemy.Enum("chore", "act"))
     data = sqlalchemy.Column(
-        sqlalchemy.ext.mutable.MutableDict.as_mutable(
-            sqlalchemy_jsonfield.JSONField(enforce_string=True,enforce_unicode=False)
+        MutableData.as_mutable(
+            DataField("json")
         ), 
         nullable=False
     )
 
-    sqlalchemy.schema.UniqueConstraint('name', 'kind', name='label')
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint('name', 'kind', name='label'),
+    )
 
     def __repr__(self):
         return "<Template(name='%s',kind='%s')>" % (self.name, self.kind)
@@ -90,21 +451,187 @@ class Chore(Base):
     status = sqlalchemy.Column(sqlalchemy.Enum("started", "ended"))
     created = sqlalchemy.Column(sqlalchemy.Integer)
     updated = sqlalchemy.Column(sqlalchemy.Integer)
+    due = sqlalchemy.Column(sqlalchemy.Float(precision=53))
+    active = sqlalchemy.Column(sqlalchemy.Integer)
     data = sqlalchemy.Column(
-        sqlalchemy.ext.mutable.MutableDict.as_mutable(
-            sqlalchemy_jsonfield.JSONField(enforce_string=True,enforce_unicode=False)
+        MutableData.as_mutable(
+            DataField("compact")
         ), 
         nullable=False
     )
 
-    person = sqlalchemy.orm.relationship("Person") 
+    # Always wanted, to speak or show, and loaded with the chore so it's
+    # there even once the session's gone
+
+    person = sqlalchemy.orm.relationship("Person", lazy="joined", innerjoin=True) 
+    tasks = sqlalchemy.orm.relationship(
+        "Task", 
+        order_by="Task.position", 
+        back_populates="chore", 
+        cascade="all, delete-orphan"
+    )
 
-    sqlalchemy.schema.UniqueConstraint('name', 'person_id', 'created', name='label')
+    # Lists come newest first, by status or person, and reminders go by due.
+    # Index names are per database in SQLite, so they're prefixed.
+
+    __table_args__ = (
+        sqlalchemy.Index('chore_created', 'created'),
+        sqlalchemy.Index('chore_status_created', 'status', 'created'),
+        sqlalchemy.Index('chore_person_created', 'person_id', 'created'),
+        sqlalchemy.Index('status_due', 'status', 'due'),
+    )
 
     def __repr__(self):
         return "<Chore(name='%s',person='%s',created=%s)>" % (self.name, self.person.name, self.created)
 
 
+class Task(Base):
+    """
+    A chore's task as a row of its own, for chores not keeping them in data
+    """
+
+    __tablename__ = "task"
+
+    chore_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("chore.chore_id", ondelete="CASCADE"), primary_key=True)
+    position = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=False)
+    text = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+
+    # Double precision, as single would round times off by minutes
+
+    start = sqlalchemy.Column(sqlalchemy.Float(precision=53))
+    end = sqlalchemy.Column(sqlalchemy.Float(precision=53))
+    paused = sqlalchemy.Column(sqlalchemy.Boolean)
+    skipped = sqlalchemy.Column(sqlalchemy.Boolean)
+    notified = sqlalchemy.Column(sqlalchemy.Float(precision=53))
+    delay = sqlalchemy.Column(sqlalchemy.Float(precision=53))
+    interval = sqlalchemy.Column(sqlalchemy.Float(precision=53))
+    data = sqlalchemy.Column(
+        MutableData.as_mutable(
+            DataField("compact")
+        ), 
+        nullable=False
+    )
+
+    chore = sqlalchemy.orm.relationship("Chore", back_populates="tasks")
+
+    # The chore has us already
+
+    _json_exclude = ["chore"]
+
+    # Task keys with columns, anything else goes in data
+
+    COLUMNS = ("text", "start", "end", "paused", "skipped", "notified", "delay", "interval")
+
+    def __repr__(self):
+        return "<Task(chore_id=%s,position=%s,text='%s')>" % (self.chore_id, self.position, self.text)
+
+
+def task_rows(tasks):
+    """
+    Task rows from a list of task dicts
+    """
+
+    return [
+        Task(
+            position=position,
+            data={key: value for key, value in task.items() if key not in Task.COLUMNS},
+            **{key: value for key, value in task.items() if key in Task.COLUMNS}
+        )
+        for position, task in enumerate(tasks)
+    ]
+
+
+class TaskData(collections.abc.MutableMapping):
+    """
+    A Task row looking like a task dict, so the same code handles both. A
+    column that's None isn't there. Starting and ending keeps the chore's
+    active pointing at its first started, unended task.
+    """
+
+    def __init__(self, task):
+
+        self.task = task
+
+    def __getitem__(self, key):
+
+        if key in Task.COLUMNS:
+
+            value = getattr(self.task, key)
+
+            if value is None:
+                raise KeyError(key)
+
+            return value
+
+        return self.task.data[key]
+
+    def __setitem__(self, key, value):
+
+        if key in Task.COLUMNS:
+            setattr(self.task, key, value)
+        else:
+            self.task.data[key] = value
+
+        if key in ("start", "end"):
+            self.activate()
+
+    def __delitem__(self, key):
+
+        if key in Task.COLUMNS:
+
+            if getattr(self.task, key) is None:
+                raise KeyError(key)
+
+            setattr(self.task, key, None)
+
+        else:
+            del self.task.data[key]
+
+        if key in ("start", "end"):
+            self.activate()
+
+    def __iter__(self):
+
+        for key in Task.COLUMNS:
+            if getattr(self.task, key) is not None:
+                yield key
+
+        yield from self.task.data
+
+    def __len__(self):
+
+        return len(list(iter(self)))
+
+    def __eq__(self, other):
+
+        if isinstance(other, TaskData):
+            return self.task is other.task
+
+        return dict(self) == other
+
+    def activate(self):
+        """
+        Moves the chore's active pointer if this task's changed it
+        """
+
+        chore = self.task.chore
+        position = self.task.position
+
+        if self.task.start is not None and self.task.end is None:
+
+            if chore.active is None or position < chore.active:
+                chore.active = position
+
+        elif chore.active == position:
+
+            # Only what's after can be active now, as this was the first
+
+            chore.active = next((
+                task.position for task in chore.tasks
+                if task.position > position and task.start is not None and task.end is None
+            ), None)
+
+
 class Act(Base):
 
     __tablename__ = "act"
@@ -115,29 +642,93 @@ class Act(Base):
     value = sqlalchemy.Column(sqlalchemy.Enum("positive", "negative"))
     created = sqlalchemy.Column(sqlalchemy.Integer)
     data = sqlalchemy.Column(
-        sqlalchemy.ext.mutable.MutableDict.as_mutable(
-            sqlalchemy_jsonfield.JSONField(enforce_string=True,enforce_unicode=False)
+        MutableData.as_mutable(
+            DataField("compact")
         ), 
         nullable=False
     )
 
-    person = sqlalchemy.orm.relationship("Person") 
+    # Same as chores, loaded along with the act
+
+    person = sqlalchemy.orm.relationship("Person", lazy="joined", innerjoin=True) 
 
-    sqlalchemy.schema.UniqueConstraint('name', 'person_id', 'created', name='label')
+    # Lists come newest first, for everyone or by person
+
+    __table_args__ = (
+        sqlalchemy.Index('act_created', 'created'),
+        sqlalchemy.Index('act_person_created', 'person_id', 'created'),
+    )
 
     def __repr__(self):
         return "<Act(name='%s',person='%s',created=%s)>" % (self.name, self.person.name, self.created)
 
 
-def create_database():
+class Lease(Base):
+    """
+    Something only one process should be doing at a time, who's doing it,
+    and till when unless they renew
+    """
+
+    __tablename__ = "lease"
+
+    name = sqlalchemy.Column(sqlalchemy.String(128), primary_key=True)
+    holder = sqlalchemy.Column(sqlalchemy.String(128), nullable=False)
+    expires = sqlalchemy.Column(sqlalchemy.Float(precision=53), nullable=False)
+
+    def __repr__(self):
+        return "<Lease(name='%s',holder='%s',expires=%s)>" % (self.name, self.holder, self.expires)
+
+
+def recode(session, model):
+    """
+    Rewrites every row's data with the model's current codec
+    """
+
+    rows = 0
+
+    for instance in session.query(model):
+        sqlalchemy.orm.attributes.flag_modified(instance, "data")
+        rows += 1
+
+    session.commit()
+
+    return rows
 
-    connection = pymysql.connect(host='mysql', user='root')
+
+def create_database(host=None, port=None, url=None):
+    """
+    Creates the database empty, dropping it first if it's there
+    """
+
+    url = sqlalchemy.engine.url.make_url(database_url(host, port, url))
+
+    # SQLite just needs the file gone, in memory is always empty
+
+    if url.drivername.startswith("sqlite"):
+
+        if url.database and url.database != ":memory:" and os.path.exists(url.database):
+            os.remove(url.database)
+
+        return
+
+    # Same connection options the engine gets from the URL's query, the ones
+    # that matter before there's a database
+
+    options = {name: url.query[name] for name in ("charset", "unix_socket") if name in url.query}
+
+    connection = pymysql.connect(
+        host=url.host,
+        port=url.port or 3306,
+        user=url.username or 'root',
+        password=url.password or "",
+        **options
+    )
 
     try:
 
         with connection.cursor() as cursor:
-            cursor.execute("DROP DATABASE IF EXISTS nandy")
-            cursor.execute("CREATE DATABASE nandy")
+            cursor.execute(f"DROP DATABASE IF EXISTS {url.database}")
+            cursor.execute(f"CREATE DATABASE {url.database}")
 
         connection.commit()
 
@@ -154,6 +745,13 @@ class Sample:
 
     def person(self, name, email=None):
 
+        # Names are unique, so reuse
+
+        person = self.session.query(Person).filter_by(name=name).one_or_none()
+
+        if person is not None:
+            return person
+
         if email is None:
             email = name
 
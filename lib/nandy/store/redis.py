@@ -3,26 +3,173 @@ Main module for interacting with Nandy in Redis
 """
 
 import os
+import time
 import json
+import asyncio
+import threading
+import contextlib
 
 import redis
+import msgpack
+
+# Faster JSON if it's around, same messages either way
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Messages in anything but JSON start with a version byte saying what they are
+
+MSGPACK = b"\x01"
+
+
+def encode(data, codec="json"):
+    """
+    Turns a message into bytes with a codec, "json", "orjson" or "msgpack".
+    JSON of either kind has no prefix, so consumers that only know JSON can
+    still read it.
+    """
+
+    if codec == "msgpack":
+        return MSGPACK + msgpack.packb(data, use_bin_type=True)
+
+    if codec == "orjson" and orjson is not None:
+        return orjson.dumps(data)
+
+    return json.dumps(data).encode("utf-8")
+
+
+def decode(message):
+    """
+    Turns bytes back into a message whatever codec made them
+    """
+
+    if message[:1] == MSGPACK:
+        return msgpack.unpackb(message[1:], raw=False)
+
+    if orjson is not None:
+        return orjson.loads(message)
+
+    return json.loads(message)
 
 
 class Channel(object):
+    """
+    Publishes and listens for messages on a Redis channel. Publishes with
+    codec, REDIS_CODEC or "json" if not given, but reads any of them. Only use
+    "msgpack" once everything listening can decode it.
+    """
+
+    CODECS = ("json", "orjson", "msgpack")
 
-    def __init__(self, channel, host=None, port=None, prefix=None):
+    def __init__(self, channel, host=None, port=None, prefix=None, size=None, codec=None):
 
         self.channel = channel
         self.redis = redis.StrictRedis(host=host or os.environ["REDIS_HOST"], port=port or int(os.environ["REDIS_PORT"]))
         self.prefix = prefix or "nandy"
         self.pubsub = None
 
+        self.codec = codec or os.environ.get("REDIS_CODEC", "json")
+
+        if self.codec not in self.CODECS:
+            raise ValueError(f"unknown codec {self.codec}")
+
+        # Each thread batches on its own, see batching and queue
+
+        self.size = size
+        self.local = threading.local()
+
+        self.published = 0
+        self.flushed = 0
+
+    @property
+    def batching(self):
+        """
+        How many batches this thread's in
+        """
+
+        return getattr(self.local, "batching", 0)
+
+    @batching.setter
+    def batching(self, value):
+
+        self.local.batching = value
+
+    @property
+    def queue(self):
+        """
+        What this thread's batched up to send
+        """
+
+        if not hasattr(self.local, "queue"):
+            self.local.queue = []
+
+        return self.local.queue
+
+    @queue.setter
+    def queue(self, value):
+
+        self.local.queue = value
+
     def publish(self, data):
         """
-        Sends a message to the channel
+        Sends a message to the channel, or queues it if we're batching
+        """
+
+        self.published += 1
+
+        if self.batching:
+
+            self.queue.append(encode(data, self.codec))
+
+            if self.size and len(self.queue) >= self.size:
+                self.flush()
+
+            return
+
+        self.redis.publish(f"{self.prefix}/{self.channel}", encode(data, self.codec))
+        self.flushed += 1
+
+    def flush(self):
+        """
+        Sends all queued messages in order through a single pipeline
+        """
+
+        if not self.queue:
+            return
+
+        pipeline = self.redis.pipeline(transaction=False)
+
+        for message in self.queue:
+            pipeline.publish(f"{self.prefix}/{self.channel}", message)
+
+        pipeline.execute()
+
+        self.queue = []
+        self.flushed += 1
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Queues everything published inside and sends it all at the end. If
+        what's inside fails, whatever's still queued is dropped instead.
         """
 
-        self.redis.publish(f"{self.prefix}/{self.channel}", json.dumps(data))
+        self.batching += 1
+
+        try:
+            yield self
+        except Exception:
+            self.batching -= 1
+            if not self.batching:
+                self.queue = []
+            raise
+
+        self.batching -= 1
+
+        if not self.batching:
+            self.flush()
 
     def subscribe(self):
         """
@@ -32,20 +179,65 @@ class Channel(object):
         self.pubsub = self.redis.pubsub()
         self.pubsub.subscribe(f"{self.prefix}/{self.channel}") 
 
-    def next(self):
+    def next(self, timeout=None):
         """
-        Gets the next message from the speech channel
+        Gets the next message from the speech channel, waiting up 
+        to timeout seconds for one if set
         """
 
         if not self.pubsub:
             self.subscribe()
 
-        message = self.pubsub.get_message()
+        deadline = time.time() + timeout if timeout else None
+
+        while True:
+
+            message = self.pubsub.get_message(timeout=max(deadline - time.time(), 0) if deadline else 0)
+
+            if message and "data" in message and isinstance(message["data"], bytes):
+                return decode(message['data'])
+
+            # Skip past subscribe confirmations, but stop once nothing's there
 
-        if not message or "data" not in message or not isinstance(message["data"], bytes):
-            return None
+            if not message and (deadline is None or time.time() >= deadline):
+                return None
 
-        return json.loads(message['data'])
+    def drain(self, max_messages=None):
+        """
+        Gets all the messages already waiting, up to max_messages if set
+        """
+
+        messages = []
+
+        while max_messages is None or len(messages) < max_messages:
+
+            message = self.next()
+
+            if message is None:
+                break
+
+            messages.append(message)
+
+        return messages
+
+    async def listen(self, wait=1):
+        """
+        Yields messages as they arrive, waiting in an executor so the
+        event loop isn't blocked
+        """
+
+        loop = asyncio.get_event_loop()
+
+        while True:
+
+            message = await loop.run_in_executor(None, self.next, wait)
+
+            if message is not None:
+                yield message
+
+    def __aiter__(self):
+
+        return self.listen()
 
 
 class MockRedis(object):
@@ -58,11 +250,25 @@ class MockRedis(object):
 
         self.data = {}
         self.messages = []
+        self.executed = 0
 
     def publish(self, channel, message):
 
         self.channel = channel
-        self.messages.append({"data": message.encode("utf-8")})
+        self.messages.append({"data": message if isinstance(message, bytes) else message.encode("utf-8")})
+
+    def get(self, key):
+
+        return self.data.get(key)
+
+    def incr(self, key):
+
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode("utf-8")
+        return int(self.data[key])
+
+    def pipeline(self, transaction=True):
+
+        return MockRedisPipeline(self)
 
     def pubsub(self):
 
@@ -72,7 +278,27 @@ class MockRedis(object):
 
         self.channel = channel
 
-    def get_message(self):
+    def get_message(self, timeout=0):
 
         if self.messages:
             return self.messages.pop(0)  
+
+
+class MockRedisPipeline(object):
+
+    def __init__(self, redis):
+
+        self.redis = redis
+        self.commands = []
+
+    def publish(self, channel, message):
+
+        self.commands.append((channel, message))
+
+    def execute(self):
+
+        for channel, message in self.commands:
+            self.redis.publish(channel, message)
+
+        self.redis.executed += 1
+        self.commands = []
@@ -39,6 +39,8 @@ CREATE TABLE `act` (
   `data` text NOT NULL,
   PRIMARY KEY (`act_id`),
   KEY `person_id` (`person_id`),
+  KEY `act_created` (`created`),
+  KEY `act_person_created` (`person_id`,`created`),
   CONSTRAINT `act_ibfk_1` FOREIGN KEY (`person_id`) REFERENCES `person` (`person_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -65,7 +67,8 @@ CREATE TABLE `area` (
   `status` varchar(32) NOT NULL,
   `updated` int(11) DEFAULT NULL,
   `data` text NOT NULL,
-  PRIMARY KEY (`area_id`)
+  PRIMARY KEY (`area_id`),
+  UNIQUE KEY `label` (`name`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -92,9 +95,15 @@ CREATE TABLE `chore` (
   `status` enum('started','ended') DEFAULT NULL,
   `created` int(11) DEFAULT NULL,
   `updated` int(11) DEFAULT NULL,
+  `due` double DEFAULT NULL,
+  `active` int(11) DEFAULT NULL,
   `data` text NOT NULL,
   PRIMARY KEY (`chore_id`),
   KEY `person_id` (`person_id`),
+  KEY `chore_created` (`created`),
+  KEY `chore_status_created` (`status`,`created`),
+  KEY `chore_person_created` (`person_id`,`created`),
+  KEY `status_due` (`status`,`due`),
   CONSTRAINT `chore_ibfk_1` FOREIGN KEY (`person_id`) REFERENCES `person` (`person_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -108,6 +117,30 @@ LOCK TABLES `chore` WRITE;
 /*!40000 ALTER TABLE `chore` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `lease`
+--
+
+DROP TABLE IF EXISTS `lease`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `lease` (
+  `name` varchar(128) NOT NULL,
+  `holder` varchar(128) NOT NULL,
+  `expires` double NOT NULL,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `lease`
+--
+
+LOCK TABLES `lease` WRITE;
+/*!40000 ALTER TABLE `lease` DISABLE KEYS */;
+/*!40000 ALTER TABLE `lease` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `person`
 --
@@ -119,7 +152,9 @@ CREATE TABLE `person` (
   `person_id` int(11) NOT NULL AUTO_INCREMENT,
   `name` varchar(64) NOT NULL,
   `email` varchar(128) NOT NULL,
-  PRIMARY KEY (`person_id`)
+  PRIMARY KEY (`person_id`),
+  UNIQUE KEY `label` (`name`),
+  UNIQUE KEY `email` (`email`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -132,6 +167,39 @@ LOCK TABLES `person` WRITE;
 /*!40000 ALTER TABLE `person` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `task`
+--
+
+DROP TABLE IF EXISTS `task`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `task` (
+  `chore_id` int(11) NOT NULL,
+  `position` int(11) NOT NULL,
+  `text` varchar(255) NOT NULL,
+  `start` double DEFAULT NULL,
+  `end` double DEFAULT NULL,
+  `paused` tinyint(1) DEFAULT NULL,
+  `skipped` tinyint(1) DEFAULT NULL,
+  `notified` double DEFAULT NULL,
+  `delay` double DEFAULT NULL,
+  `interval` double DEFAULT NULL,
+  `data` text NOT NULL,
+  PRIMARY KEY (`chore_id`,`position`),
+  CONSTRAINT `task_ibfk_1` FOREIGN KEY (`chore_id`) REFERENCES `chore` (`chore_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `task`
+--
+
+LOCK TABLES `task` WRITE;
+/*!40000 ALTER TABLE `task` DISABLE KEYS */;
+/*!40000 ALTER TABLE `task` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `template`
 --
@@ -144,7 +212,8 @@ CREATE TABLE `template` (
   `name` varchar(128) NOT NULL,
   `kind` enum('chore','act') DEFAULT NULL,
   `data` text NOT NULL,
-  PRIMARY KEY (`template_id`)
+  PRIMARY KEY (`template_id`),
+  UNIQUE KEY `label` (`name`,`kind`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
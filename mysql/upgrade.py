@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+
+import os
+
+import nandy.data
+
+# Bring the tables up to date, then give started chores their due, as
+# remind_chore only looks at chores that have one
+
+data = nandy.data.NandyData()
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "upgrade.sql"), "r") as upgrade_file:
+    statements = "\n".join(line for line in upgrade_file if not line.startswith("--")).split(";")
+
+for statement in statements:
+    if statement.strip():
+        data.mysql.session.execute(statement)
+
+data.mysql.session.commit()
+
+print(f"Scheduled {data.remind_schedule()} chores")
+
+data.mysql.session.close()
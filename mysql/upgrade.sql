@@ -0,0 +1,54 @@
+-- Upgrades a nandy database from before the due column, the task and lease
+-- tables and the indexes to the schema in nandy.sql. Run it just the once,
+-- with mysql/upgrade.py, which then schedules the started chores, or by hand
+-- followed by NandyData().remind_schedule():
+--
+--   mysql -h mysql -u root nandy < mysql/upgrade.sql
+--
+-- The unique keys fail if there are already duplicate names or emails,
+-- those need sorting out first.
+
+ALTER TABLE `chore`
+  ADD COLUMN `due` double DEFAULT NULL AFTER `updated`,
+  ADD COLUMN `active` int(11) DEFAULT NULL AFTER `due`,
+  ADD KEY `chore_created` (`created`),
+  ADD KEY `chore_status_created` (`status`,`created`),
+  ADD KEY `chore_person_created` (`person_id`,`created`),
+  ADD KEY `status_due` (`status`,`due`);
+
+ALTER TABLE `act`
+  ADD KEY `act_created` (`created`),
+  ADD KEY `act_person_created` (`person_id`,`created`);
+
+ALTER TABLE `area`
+  ADD UNIQUE KEY `label` (`name`);
+
+ALTER TABLE `person`
+  ADD UNIQUE KEY `label` (`name`),
+  ADD UNIQUE KEY `email` (`email`);
+
+ALTER TABLE `template`
+  ADD UNIQUE KEY `label` (`name`,`kind`);
+
+CREATE TABLE IF NOT EXISTS `task` (
+  `chore_id` int(11) NOT NULL,
+  `position` int(11) NOT NULL,
+  `text` varchar(255) NOT NULL,
+  `start` double DEFAULT NULL,
+  `end` double DEFAULT NULL,
+  `paused` tinyint(1) DEFAULT NULL,
+  `skipped` tinyint(1) DEFAULT NULL,
+  `notified` double DEFAULT NULL,
+  `delay` double DEFAULT NULL,
+  `interval` double DEFAULT NULL,
+  `data` text NOT NULL,
+  PRIMARY KEY (`chore_id`,`position`),
+  CONSTRAINT `task_ibfk_1` FOREIGN KEY (`chore_id`) REFERENCES `chore` (`chore_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+CREATE TABLE IF NOT EXISTS `lease` (
+  `name` varchar(128) NOT NULL,
+  `holder` varchar(128) NOT NULL,
+  `expires` double NOT NULL,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
@@ -10,8 +10,13 @@ setup(
         "redis==2.10.6",
         "PyMySQL==0.9.3",
         "SQLAlchemy==1.2.15",
-        "SQLAlchemy-JSONField==0.7.1",
+        "msgpack==0.6.0",
         "flask_jsontools==0.1.1-0",
         "graphyte==1.5"
-    ]
+    ],
+    entry_points={
+        "console_scripts": [
+            "nandy-daemon=nandy.daemon:main"
+        ]
+    }
 )
\ No newline at end of file
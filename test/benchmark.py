@@ -0,0 +1,295 @@
+"""
+Benchmarks for the chore lifecycle and reminder loop
+
+Runs against SQLite or a local MySQL with Redis and Graphite mocked out:
+
+    python -m test.benchmark --url sqlite:////tmp/nandy.db
+    python -m test.benchmark --url mysql+pymysql://root@localhost:3306/nandy_bench --save before.json
+    python -m test.benchmark --url sqlite:////tmp/nandy.db --compare before.json
+
+Every scenario drops and recreates all the tables, so anything but SQLite
+has to be a database named *_bench, unless --force is given.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import unittest.mock
+
+import sqlalchemy
+import sqlalchemy.event
+
+import nandy.data
+import nandy.store.mysql
+import nandy.store.redis
+import nandy.store.graphite
+
+
+class Benchmark(object):
+    """
+    Sets up a fresh NandyData per scenario and measures each operation
+    """
+
+    def __init__(self, url, tasks=5, count=100, sizes=(10, 1000, 100000), ticks=5, force=False):
+
+        # The tables get dropped, so make sure they're not anyone's real ones
+
+        parsed = sqlalchemy.engine.url.make_url(url)
+
+        if not force and not parsed.drivername.startswith("sqlite") and not (parsed.database or "").endswith("_bench"):
+            raise ValueError(f"won't drop the tables in {parsed.database}, use a database named *_bench or force")
+
+        self.url = url
+        self.tasks = tasks
+        self.count = count
+        self.sizes = sizes
+        self.ticks = ticks
+
+        self.results = {}
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def data(self, clock=None):
+        """
+        Fresh tables and a NandyData counting its queries
+        """
+
+        # The mocks never connect, they just need somewhere
+
+        for name, value in [("REDIS_HOST", "redis"), ("REDIS_PORT", "6379"), ("GRAPHITE_HOST", "graphite"), ("GRAPHITE_PORT", "2003")]:
+            os.environ.setdefault(name, value)
+
+        data = nandy.data.NandyData(nandy.store.mysql.MySQL(url=self.url), clock=clock)
+
+        nandy.store.mysql.Base.metadata.drop_all(data.mysql.engine)
+        nandy.store.mysql.Base.metadata.create_all(data.mysql.engine)
+
+        self.queries = 0
+
+        def count(*args):
+            self.queries += 1
+
+        sqlalchemy.event.listen(data.mysql.engine, "before_cursor_execute", count)
+
+        return data
+
+    def measure(self, name, operation, count):
+        """
+        Times count calls of operation, each getting its index
+        """
+
+        latencies = []
+        queries = self.queries
+        start = time.perf_counter()
+
+        for index in range(count):
+            before = time.perf_counter()
+            operation(index)
+            latencies.append(time.perf_counter() - before)
+
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+
+        def percentile(fraction):
+            return latencies[int(round((len(latencies) - 1) * fraction))]
+
+        self.results[name] = {
+            "count": count,
+            "ops": count / elapsed if elapsed else 0,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": latencies[-1],
+            "queries": (self.queries - queries) / count
+        }
+
+        return self.results[name]
+
+    def template(self, person="kid"):
+
+        return {
+            "person": person,
+            "name": "Bench",
+            "text": "chore it",
+            "interval": 60,
+            "tasks": [{"text": f"do it {index}", "interval": 60} for index in range(self.tasks)]
+        }
+
+    def chore_create(self):
+
+        data = self.data()
+        data.person_create({"name": "kid", "email": "kid"})
+
+        self.measure(f"chore_create tasks={self.tasks}", lambda index: data.chore_create(template=self.template()), self.count)
+
+    def task_complete(self):
+
+        data = self.data()
+        data.person_create({"name": "kid", "email": "kid"})
+        chore = data.chore_create(template=self.template())
+
+        # Each chore_next completes one task and starts the next
+
+        self.measure(f"task_complete chain={self.tasks}", lambda index: data.chore_next(chore), self.tasks)
+
+    def remind_chore(self, size):
+
+        # Our own clock, moved past the interval each pass so every pass
+        # reminds the same chores rather than finding them all just done
+
+        now = time.time()
+        clock = [now]
+        data = self.data(clock=lambda: clock[0])
+        person = data.person_create({"name": "kid", "email": "kid"})
+
+        # Insert directly so big sizes don't take forever, one in ten due
+        # every minute, the rest not for a day
+
+        rows = []
+
+        for index in range(size):
+
+            if index % 10 == 0:
+                notified, interval = now - 120, 60
+            else:
+                notified, interval = now, 24 * 60 * 60
+
+            chore = {
+                "text": "chore it",
+                "language": "en-us",
+                "start": now,
+                "interval": interval,
+                "notified": notified,
+                "tasks": [{"text": "do it", "start": now, "interval": interval, "notified": notified}]
+            }
+
+            rows.append({
+                "person_id": person.person_id,
+                "name": f"Bench {index}",
+                "status": "started",
+                "created": int(now),
+                "updated": int(now),
+                "due": data.due_chore(chore),
+                "data": chore
+            })
+
+        data.mysql.session.bulk_insert_mappings(nandy.store.mysql.Chore, rows)
+        data.mysql.session.commit()
+
+        def remind(index):
+            clock[0] = now + index * 61
+            data.remind_chore()
+
+        self.measure(f"remind_chore chores={size}", remind, self.ticks)
+
+    def act_create(self):
+
+        data = self.data()
+        data.person_create({"name": "kid", "email": "kid"})
+
+        self.measure("act_create", lambda index: data.act_create(template={
+            "person": "kid",
+            "name": "Bench",
+            "value": "positive"
+        }), self.count)
+
+    def lists(self):
+
+        data = self.data()
+        data.person_create({"name": "kid", "email": "kid"})
+
+        data.chore_create_many([{"template": self.template()} for _ in range(self.count)])
+        data.act_create_many([{"template": {"person": "kid", "name": "Bench", "value": "positive"}} for _ in range(self.count)])
+
+        self.measure(f"chore_list rows={self.count}", lambda index: data.chore_list(), self.ticks)
+        self.measure(f"act_list rows={self.count}", lambda index: data.act_list(), self.ticks)
+
+    def run(self):
+
+        self.chore_create()
+        self.task_complete()
+
+        for size in self.sizes:
+            self.remind_chore(size)
+
+        self.act_create()
+        self.lists()
+
+        return self.results
+
+
+def report(results, baseline=None, threshold=1.2):
+    """
+    Prints the results, and how they compare to a baseline if given.
+    Returns the names that got slower than threshold times the baseline.
+    """
+
+    regressions = []
+
+    print(f"{'benchmark':<32} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'vs base':>8}")
+
+    for name, result in results.items():
+
+        line = f"{name:<32} {result['ops']:>10.1f} {result['p50'] * 1000:>9.3f} {result['p95'] * 1000:>9.3f} {result['p99'] * 1000:>9.3f} {result['queries']:>8.1f}"
+
+        if baseline and name in baseline:
+
+            ratio = result["p50"] / baseline[name]["p50"] if baseline[name]["p50"] else 1
+            line += f" {ratio:>7.2f}x"
+
+            if ratio > threshold:
+                regressions.append(name)
+                line += " SLOWER"
+
+        print(line)
+
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmarks the chore lifecycle and reminder loop")
+    parser.add_argument("--url", default="sqlite://", help="database to run against")
+    parser.add_argument("--tasks", type=int, default=5, help="tasks per chore")
+    parser.add_argument("--count", type=int, default=100, help="operations per benchmark")
+    parser.add_argument("--sizes", default="10,1000,100000", help="started chores for remind_chore")
+    parser.add_argument("--ticks", type=int, default=5, help="remind_chore and list passes")
+    parser.add_argument("--save", help="file to store results in")
+    parser.add_argument("--compare", help="file of stored results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 ratio that counts as a regression")
+    parser.add_argument("--force", action="store_true", help="drop the tables even if the database isn't *_bench")
+    args = parser.parse_args(argv)
+
+    try:
+        benchmark = Benchmark(
+            args.url,
+            tasks=args.tasks,
+            count=args.count,
+            sizes=[int(size) for size in args.sizes.split(",")],
+            ticks=args.ticks,
+            force=args.force
+        )
+    except ValueError as exception:
+        parser.error(str(exception))
+
+    results = benchmark.run()
+
+    baseline = None
+
+    if args.compare:
+        with open(args.compare, "r") as compare_file:
+            baseline = json.load(compare_file)
+
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w") as save_file:
+            json.dump(results, save_file, indent=2, sort_keys=True)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+import unittest
+import unittest.mock
+
+import json
+import signal
+import logging
+
+import nandy.data
+import nandy.daemon
+import nandy.store.graphite
+import nandy.store.redis
+import nandy.store.mysql
+
+
+class TestDaemon(unittest.TestCase):
+
+    maxDiff = None
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def setUp(self):
+
+        nandy.store.mysql.create_database()
+
+        self.clock = unittest.mock.MagicMock(return_value=7)
+
+        self.data = nandy.data.NandyData(clock=self.clock)
+        self.sample = nandy.store.mysql.Sample(self.data.mysql.session)
+        nandy.store.mysql.Base.metadata.create_all(self.data.mysql.engine)
+
+        self.daemon = nandy.daemon.Daemon(self.data, idle=30, minimum=0.5, wait=2)
+
+    def tearDown(self):
+
+        self.data.mysql.session.close()
+
+    def event(self, message):
+
+        self.data.event.redis.messages.append({"data": json.dumps(message).encode("utf-8")})
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def test___init__(self):
+
+        self.assertIs(self.daemon.data, self.data)
+        self.assertEqual(self.daemon.idle, 30)
+        self.assertEqual(self.daemon.minimum, 0.5)
+        self.assertEqual(self.daemon.wait, 2)
+        self.assertFalse(self.daemon.stopping.is_set())
+        self.assertIsNone(self.daemon.shards)
+        self.assertEqual(self.daemon.ttl, 60)
+
+        init = nandy.daemon.Daemon()
+
+        self.assertIsInstance(init.data, nandy.data.NandyData)
+        self.assertEqual(init.idle, 60)
+        self.assertEqual(init.minimum, 0.1)
+        self.assertEqual(init.wait, 1)
+        self.assertRegex(init.holder, r"^.+/\d+$")
+
+        init = nandy.daemon.Daemon(self.data, shards=[(0, 2), (1, 2)], most=1, ttl=5, holder="unit")
+
+        self.assertEqual(init.shards, [(0, 2), (1, 2)])
+        self.assertEqual(init.most, 1)
+        self.assertEqual(init.ttl, 5)
+        self.assertEqual(init.holder, "unit")
+        self.assertEqual(init.held, [])
+
+    def test_lease(self):
+
+        self.assertEqual(self.daemon.lease((1, 2)), "remind/1/2")
+        self.assertEqual(self.daemon.lease(range(1, 2)), "remind/1-2")
+
+    def test_claim(self):
+
+        one = nandy.daemon.Daemon(self.data, shards=[(0, 3), (1, 3), (2, 3)], most=2, holder="one")
+        two = nandy.daemon.Daemon(self.data, shards=[(0, 3), (1, 3), (2, 3)], most=2, holder="two")
+
+        one.claim()
+        two.claim()
+
+        self.assertEqual(one.held, [(0, 3), (1, 3)])
+        self.assertEqual(two.held, [(2, 3)])
+
+        # Keeps what it has, picks up what's let go
+
+        one.release()
+        two.claim()
+
+        self.assertEqual(one.held, [])
+        self.assertEqual(two.held, [(2, 3), (0, 3)])
+
+        # Or what's expired
+
+        self.clock.return_value = 7 + 120
+
+        one.claim()
+
+        self.assertEqual(one.held, [(0, 3), (1, 3)])
+
+        two.claim()
+
+        self.assertEqual(two.held, [(2, 3)])
+
+    def test_release(self):
+
+        self.daemon.shards = [(0, 1)]
+        self.daemon.claim()
+        self.daemon.release()
+
+        self.assertEqual(self.daemon.held, [])
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Lease).count(), 0)
+
+    def test_next(self):
+
+        kid = self.sample.chore(person="kid", data={"interval": 5, "notified": 3})
+        other = self.sample.chore(person="other", data={"interval": 5, "notified": 1})
+
+        self.assertEqual(self.daemon.next(), 6)
+
+        # Just what's held
+
+        self.daemon.shards = [range(kid.person_id, kid.person_id + 1), range(other.person_id, other.person_id + 1)]
+
+        self.assertIsNone(self.daemon.next())
+
+        self.daemon.held = self.daemon.shards[:1]
+        self.assertEqual(self.daemon.next(), 8)
+
+        self.daemon.held = self.daemon.shards
+        self.assertEqual(self.daemon.next(), 6)
+
+        # To the fraction, so we don't wake before it's really due
+
+        self.sample.chore(person="fraction", data={"interval": 5, "notified": 0.5})
+
+        self.daemon.shards = None
+        self.assertEqual(self.daemon.next(), 5.5)
+
+    def test_until(self):
+
+        self.assertEqual(self.daemon.until(7, None), 37)
+        self.assertEqual(self.daemon.until(7, 12), 12)
+        self.assertEqual(self.daemon.until(7, 100), 37)
+        self.assertEqual(self.daemon.until(7, 5), 7.5)
+
+    def test_sleep(self):
+
+        # Sleeps in waits, no longer than what's left
+
+        with unittest.mock.patch.object(self.data.event, "next", return_value=None) as mock_next:
+
+            self.clock.side_effect = [7, 9, 10, 10.5]
+
+            self.assertFalse(self.daemon.sleep(10.5))
+            self.assertEqual(mock_next.call_args_list, [
+                unittest.mock.call(timeout=2),
+                unittest.mock.call(timeout=1.5),
+                unittest.mock.call(timeout=0.5)
+            ])
+
+        # Events wake us and get cleared out
+
+        self.clock.side_effect = None
+        self.event({"type": "chore"})
+        self.event({"type": "chore"})
+
+        self.assertTrue(self.daemon.sleep(100))
+        self.assertEqual(self.daemon.woken, 1)
+        self.assertEqual(self.data.event.redis.messages, [])
+
+        # Stopping doesn't wait
+
+        self.daemon.stop()
+        self.assertFalse(self.daemon.sleep(100))
+
+    def test_tick(self):
+
+        self.sample.chore(person="kid", data={"interval": 5, "notified": 0})
+
+        self.daemon.tick()
+
+        self.assertEqual(self.daemon.ticks, 1)
+        self.assertEqual(len(self.data.speech.redis.messages), 1)
+        self.assertEqual([message["name"] for message in self.data.graphite.sender.messages], ["remind.latency"])
+        self.assertIsNone(self.daemon.lag)
+
+        # Lag is how far past due we started
+
+        self.clock.return_value = 13
+
+        self.daemon.tick(12)
+
+        self.assertEqual(self.daemon.lag, 1)
+        self.assertEqual(self.data.graphite.sender.messages[-1], {"name": "remind.lag", "value": 1, "timestamp": 13})
+
+        self.daemon.tick(14)
+
+        self.assertEqual(self.daemon.lag, 0)
+
+        # Sharded, only what it can claim
+
+        other = self.sample.chore(person="other", data={"interval": 5, "notified": 0})
+        self.data.lease_acquire(f"remind/{other.person_id}-{other.person_id + 1}", "someone", 60)
+
+        self.daemon.shards = [range(other.person_id, other.person_id + 1), range(0, other.person_id)]
+        self.clock.return_value = 20
+
+        self.daemon.tick()
+
+        self.assertEqual(self.daemon.held, [range(0, other.person_id)])
+        self.assertEqual([json.loads(message["data"])["text"] for message in self.data.speech.redis.messages[2:]], [
+            "kid, you still have to chore it"
+        ])
+
+    def test_run(self):
+
+        self.sample.chore(person="kid", data={"interval": 5, "notified": 0})
+
+        # Ticks, sleeps till the chore's due again, gets woken, then stopped
+
+        sleeps = []
+
+        def sleep(until):
+
+            sleeps.append(until)
+
+            if len(sleeps) == 2:
+                return True
+
+            if len(sleeps) == 3:
+                self.daemon.stop()
+
+            return False
+
+        with unittest.mock.patch.object(self.daemon, "sleep", side_effect=sleep), \
+             unittest.mock.patch.object(self.data, "remind_schedule", wraps=self.data.remind_schedule) as mock_schedule:
+            self.daemon.run()
+
+        mock_schedule.assert_called_once_with()
+        self.assertEqual(self.daemon.ticks, 3)
+        self.assertEqual(sleeps, [12, 12, 12])
+        self.assertEqual(
+            [message["name"] for message in self.data.graphite.sender.messages],
+            ["remind.latency", "remind.latency", "remind.lag", "remind.latency"]
+        )
+
+        # Failures anywhere get logged, rolled back and backed off from, and
+        # don't stop it
+
+        self.daemon.stopping.clear()
+
+        waits = []
+
+        def wait(timeout):
+            waits.append(timeout)
+            if len(waits) == 3:
+                self.daemon.stop()
+            return self.daemon.stopping.is_set()
+
+        with unittest.mock.patch.object(self.data, "remind_chore", side_effect=[Exception("whoops"), None, None]), \
+             unittest.mock.patch.object(self.daemon, "next", side_effect=[Exception("gone away"), None]), \
+             unittest.mock.patch.object(self.daemon, "sleep", side_effect=Exception("no redis")), \
+             unittest.mock.patch.object(self.data.mysql.session, "rollback", side_effect=[None, Exception("still gone"), None]), \
+             unittest.mock.patch.object(self.daemon.stopping, "wait", side_effect=wait), \
+             self.assertLogs("nandy", logging.ERROR) as logs:
+            self.daemon.run()
+
+        self.assertEqual(self.daemon.errors, 3)
+        self.assertEqual(waits, [0.5, 1, 2])
+        self.assertEqual(len([line for line in logs.output if "remind failed" in line]), 3)
+        self.assertEqual(len([line for line in logs.output if "rollback failed" in line]), 1)
+
+        # Leases go when it stops
+
+        self.daemon.stopping.clear()
+        self.daemon.shards = [(0, 1)]
+
+        with unittest.mock.patch.object(self.daemon, "sleep", side_effect=lambda until: self.daemon.stop()):
+            self.daemon.run()
+
+        self.assertEqual(self.daemon.held, [])
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Lease).count(), 0)
+
+    def test_backoff(self):
+
+        self.assertEqual(self.daemon.backoff(1), 0.5)
+        self.assertEqual(self.daemon.backoff(3), 2)
+        self.assertEqual(self.daemon.backoff(10), 30)
+
+    def test_rollback(self):
+
+        with unittest.mock.patch.object(self.data.mysql.session, "rollback", side_effect=Exception("gone away")), \
+             self.assertLogs("nandy", logging.ERROR) as logs:
+            self.daemon.rollback()
+
+        self.assertIn("rollback failed", logs.output[0])
+
+    def test_shard(self):
+
+        self.assertEqual(nandy.daemon.shard("1/4"), (1, 4))
+        self.assertEqual(nandy.daemon.shard("100-200"), range(100, 200))
+
+    @unittest.mock.patch("logging.basicConfig")
+    @unittest.mock.patch("signal.signal")
+    @unittest.mock.patch("nandy.daemon.Daemon")
+    def test_main(self, mock_daemon, mock_signal, mock_logging):
+
+        self.assertEqual(nandy.daemon.main(["--idle", "10", "--minimum", "1", "--wait", "3"]), 0)
+
+        mock_daemon.assert_called_once_with(idle=10, minimum=1, wait=3, shards=None, most=None, ttl=None)
+        mock_daemon.return_value.run.assert_called_once_with()
+        mock_signal.assert_has_calls([
+            unittest.mock.call(signal.SIGTERM, mock_daemon.return_value.stop),
+            unittest.mock.call(signal.SIGINT, mock_daemon.return_value.stop)
+        ])
+
+        nandy.daemon.main(["--shards", "3", "--most", "2", "--ttl", "30"])
+        self.assertEqual(mock_daemon.call_args[1]["shards"], [(0, 3), (1, 3), (2, 3)])
+        self.assertEqual(mock_daemon.call_args[1]["most"], 2)
+        self.assertEqual(mock_daemon.call_args[1]["ttl"], 30)
+
+        nandy.daemon.main(["--shard", "0/2", "--shard", "5-10"])
+        self.assertEqual(mock_daemon.call_args[1]["shards"], [(0, 2), range(5, 10)])
@@ -3,11 +3,17 @@ import unittest.mock
 
 import os
 import json
+import asyncio
+import threading
+import sqlalchemy
+import sqlalchemy.event
 
 import nandy.data
+import nandy.instrument
 import nandy.store.graphite
 import nandy.store.redis
 import nandy.store.mysql
+import nandy.store.cache
 
 
 class TestNandyData(unittest.TestCase):
@@ -28,14 +34,358 @@ class TestNandyData(unittest.TestCase):
 
         self.data.mysql.session.close()
 
+    # Time
+
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_now(self, mock_time):
+
+        mock_time.return_value = 7
+        self.assertEqual(self.data.now(), 7)
+
+        self.data.clock = lambda: 8
+        self.assertEqual(self.data.now(), 8)
+
+    # Transaction
+
+    def test_commit(self):
+
+        self.data.mysql.session.add(nandy.store.mysql.Person(name="unit", email="test"))
+        self.data.commit()
+        self.data.mysql.session.rollback()
+
+        self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Person).all()), 1)
+
+        self.data.transacting = 1
+        self.data.mysql.session.add(nandy.store.mysql.Person(name="test", email="unit"))
+        self.data.commit()
+        self.data.mysql.session.rollback()
+
+        self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Person).all()), 1)
+
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_transaction(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = self.sample.chore(person="kid", data={"start": 1}, tasks=[{"text": "do it"}, {"text": "did it"}])
+
+        with unittest.mock.patch.object(self.data.mysql.session, "commit", wraps=self.data.mysql.session.commit) as mock_commit:
+
+            with self.data.transaction() as data:
+                self.assertTrue(data.task_complete(chore.data["tasks"][0], chore))
+                self.assertTrue(data.chore_next(chore))
+                self.assertEqual(self.data.transacting, 1)
+
+            mock_commit.assert_called_once_with()
+
+        self.assertEqual(self.data.speech.redis.executed, 1)
+        self.assertEqual(len(self.data.speech.redis.messages), 4)
+
+        self.assertEqual(self.data.transacting, 0)
+        updated = self.data.mysql.session.query(nandy.store.mysql.Chore).one()
+        self.assertEqual(updated.status, "ended")
+
+        with self.assertRaises(Exception):
+            with self.data.transaction():
+                self.data.person_create({"name": "unit", "email": "test"})
+                with self.data.transaction():
+                    raise Exception("whoops")
+
+        self.assertEqual(self.data.transacting, 0)
+        self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Person).filter_by(name="unit").all()), 0)
+
+        # Nothing's said or sent for what's rolled back
+
+        chore = self.sample.chore(person="kid", name="Rolled", data={"start": 1, "text": "chore it", "language": "en-us"})
+        messages = len(self.data.speech.redis.messages)
+        metrics = len(self.data.graphite.sender.messages)
+
+        with self.assertRaises(Exception):
+            with self.data.transaction() as data:
+                self.assertTrue(data.chore_complete(chore))
+                raise Exception("whoops")
+
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Chore).get(chore.chore_id).status, "started")
+        self.assertEqual(len(self.data.speech.redis.messages), messages)
+        self.assertEqual(len(self.data.graphite.sender.messages), metrics)
+
+        # Nor if the commit fails, which rolls back
+
+        with unittest.mock.patch.object(self.data.mysql.session, "commit", side_effect=Exception("whoops")), \
+             unittest.mock.patch.object(self.data.mysql.session, "rollback", wraps=self.data.mysql.session.rollback) as mock_rollback:
+
+            with self.assertRaises(Exception):
+                with self.data.transaction() as data:
+                    self.assertTrue(data.chore_complete(chore))
+
+            mock_rollback.assert_called_once_with()
+
+        self.assertEqual(self.data.transacting, 0)
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Chore).get(chore.chore_id).status, "started")
+        self.assertEqual(len(self.data.speech.redis.messages), messages)
+        self.assertEqual(len(self.data.graphite.sender.messages), metrics)
+
+        # Other threads sharing us aren't held off
+
+        seen = []
+
+        with self.data.transaction():
+
+            thread = threading.Thread(target=lambda: seen.append(
+                (self.data.transacting, self.data.speech.batching, self.data.graphite.batching)
+            ))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(seen, [(0, 0, 0)])
+
+    # Cache
+
+    def queries(self):
+
+        queries = []
+        sqlalchemy.event.listen(self.data.mysql.engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        return queries
+
+    def test_freeze(self):
+
+        area = self.sample.area(name="unit", status="test", updated=7, data={"a": {"b": [1]}})
+
+        frozen = self.data.freeze(area)
+        self.assertEqual(frozen, {
+            "area_id": area.area_id,
+            "name": "unit",
+            "status": "test",
+            "updated": 7,
+            "data": {"a": {"b": [1]}}
+        })
+        self.assertEqual(type(frozen["data"]), dict)
+        self.assertEqual(type(frozen["data"]["a"]), dict)
+
+        frozen["data"]["a"]["b"].append(2)
+        self.assertEqual(area.data, {"a": {"b": [1]}})
+
+        self.assertEqual(self.data.freeze([area]), [self.data.freeze(area)])
+        self.assertIsNone(self.data.freeze(None))
+
+    def test_thaw(self):
+
+        area = self.sample.area(name="unit", status="test", updated=7, data={"a": 1})
+        frozen = self.data.freeze(area)
+
+        # What the session has wins
+
+        self.assertIs(self.data.thaw(nandy.store.mysql.Area, frozen), area)
+
+        self.data.mysql.session.expunge_all()
+        queries = self.queries()
+
+        thawed = self.data.thaw(nandy.store.mysql.Area, frozen)
+        self.assertIsNot(thawed, area)
+        self.assertEqual(thawed.name, "unit")
+        self.assertEqual(thawed.data, {"a": 1})
+        self.assertEqual(queries, [])
+
+        self.assertEqual(self.data.thaw(nandy.store.mysql.Area, [frozen]), [thawed])
+        self.assertIsNone(self.data.thaw(nandy.store.mysql.Area, None))
+
+        # Changes save like any other
+
+        thawed.data["a"] = 2
+        self.data.mysql.session.commit()
+
+        self.data.mysql.session.expunge_all()
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Area).one().data, {"a": 2})
+
+    def test_cached(self):
+
+        load = unittest.mock.MagicMock(return_value="unit")
+        self.assertEqual(self.data.cached(nandy.store.mysql.Area, "key", load), "unit")
+
+        self.data.cache = nandy.store.cache.Cache()
+        area = self.sample.area(name="unit", status="test", updated=7, data={"a": 1})
+        load = unittest.mock.MagicMock(return_value=area)
+
+        self.assertIs(self.data.cached(nandy.store.mysql.Area, "key", load), area)
+        self.data.mysql.session.expunge_all()
+
+        cached = self.data.cached(nandy.store.mysql.Area, "key", load)
+        self.assertEqual(cached.name, "unit")
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(list(self.data.cache.entries.keys()), [("area", "key")])
+
+    def test_invalidate(self):
+
+        self.data.invalidate(nandy.store.mysql.Area)
+
+        self.data.cache = nandy.store.cache.Cache()
+
+        self.data.invalidate(nandy.store.mysql.Area)
+        self.assertEqual(self.data.cache.versions, {"area": 1})
+        self.assertEqual(self.data.invalidated, set())
+
+        self.data.transacting = 1
+        self.data.invalidate(nandy.store.mysql.Area)
+        self.assertEqual(self.data.cache.versions, {"area": 2})
+        self.assertEqual(self.data.invalidated, {nandy.store.mysql.Area})
+
+    def test_revalidate(self):
+
+        self.data.cache = nandy.store.cache.Cache()
+
+        with self.data.transaction():
+            self.data.area_create({"name": "unit", "status": "test", "data": {}})
+            self.assertEqual(len(self.data.area_list()), 1)
+
+        self.assertEqual(self.data.cache.versions, {"area": 2})
+        self.assertEqual(self.data.invalidated, set())
+
+        # Rolled back creates don't linger
+
+        with self.assertRaises(Exception):
+            with self.data.transaction():
+                self.data.area_create({"name": "test", "status": "test", "data": {}})
+                self.assertEqual(len(self.data.area_list()), 2)
+                raise Exception("whoops")
+
+        self.assertEqual(len(self.data.area_list()), 1)
+
+    # Listing
+
+    def test_field(self):
+
+        self.assertEqual(self.data.field(nandy.store.mysql.Chore, "created"), nandy.store.mysql.Chore.created)
+
+        with self.assertRaises(ValueError):
+            self.data.field(nandy.store.mysql.Chore, "person")
+
+    def test_filters(self):
+
+        for created in [7, 8, 9]:
+            self.sample.chore(person="kid", name=f"Unit {created}", created=created)
+
+        self.sample.chore(person="kid", name="Null", created=None)
+
+        def names(filter):
+            return [chore.name for chore in self.data.mysql.session.query(nandy.store.mysql.Chore).filter(
+                *self.data.filters(nandy.store.mysql.Chore, filter)
+            ).order_by(nandy.store.mysql.Chore.chore_id)]
+
+        self.assertEqual(names(None), ["Unit 7", "Unit 8", "Unit 9", "Null"])
+        self.assertEqual(names({"created": 8}), ["Unit 8"])
+        self.assertEqual(names({"created__eq": 8}), ["Unit 8"])
+        self.assertEqual(names({"created__ne": 8}), ["Unit 7", "Unit 9"])
+        self.assertEqual(names({"created__lt": 8}), ["Unit 7"])
+        self.assertEqual(names({"created__lte": 8}), ["Unit 7", "Unit 8"])
+        self.assertEqual(names({"created__gt": 8}), ["Unit 9"])
+        self.assertEqual(names({"created__gte": 8, "created__lt": 9}), ["Unit 8"])
+        self.assertEqual(names({"created__in": [7, 9]}), ["Unit 7", "Unit 9"])
+        self.assertEqual(names({"created__notin": [7, 9]}), ["Unit 8"])
+        self.assertEqual(names({"name__like": "Unit%"}), ["Unit 7", "Unit 8", "Unit 9"])
+        self.assertEqual(names({"created__null": True}), ["Null"])
+        self.assertEqual(names({"created__null": False}), ["Unit 7", "Unit 8", "Unit 9"])
+
+        with self.assertRaises(ValueError):
+            self.data.filters(nandy.store.mysql.Chore, {"created__nope": 1})
+
+        with self.assertRaises(ValueError):
+            self.data.filters(nandy.store.mysql.Chore, {"nope__gt": 1})
+
+    def test_ordering(self):
+
+        self.assertEqual(self.data.ordering(nandy.store.mysql.Chore, ["-created"]), (
+            [nandy.store.mysql.Chore.created, nandy.store.mysql.Chore.chore_id],
+            [True, True]
+        ))
+
+        self.assertEqual(self.data.ordering(nandy.store.mysql.Chore, ["status", "-created"]), (
+            [nandy.store.mysql.Chore.status, nandy.store.mysql.Chore.created, nandy.store.mysql.Chore.chore_id],
+            [False, True, True]
+        ))
+
+        self.assertEqual(self.data.ordering(nandy.store.mysql.Chore, ["chore_id"]), (
+            [nandy.store.mysql.Chore.chore_id],
+            [False]
+        ))
+
+        with self.assertRaises(ValueError):
+            self.data.ordering(nandy.store.mysql.Chore, ["-nope"])
+
+    def test_query(self):
+
+        self.sample.chore(person="kid", name="Unit", data={"a": 1})
+
+        chore = self.data.query(nandy.store.mysql.Chore).one()
+        self.assertEqual(chore.data["a"], 1)
+
+        with unittest.mock.patch.object(nandy.store.mysql.DataField, "process_result_value") as mock_decode:
+            row = self.data.query(nandy.store.mysql.Chore, ["name", "status"]).one()
+            mock_decode.assert_not_called()
+
+        self.assertEqual(row, ("Unit", "started"))
+        self.assertEqual(row.name, "Unit")
+
+    def test_page(self):
+
+        for created in [7, 8, 8, 9]:
+            self.sample.chore(person="kid", created=created)
+
+        order = [nandy.store.mysql.Chore.created, nandy.store.mysql.Chore.chore_id]
+        query = self.data.mysql.session.query(nandy.store.mysql.Chore)
+
+        chores = self.data.page(query, order).all()
+        self.assertEqual([(chore.created, chore.chore_id) for chore in chores], [(7, 1), (8, 2), (8, 3), (9, 4)])
+
+        chores = self.data.page(query, order, limit=2, descending=True).all()
+        self.assertEqual([(chore.created, chore.chore_id) for chore in chores], [(9, 4), (8, 3)])
+
+        chores = self.data.page(query, order, cursor=chores[-1], limit=2, descending=True).all()
+        self.assertEqual([(chore.created, chore.chore_id) for chore in chores], [(8, 2), (7, 1)])
+
+        chores = self.data.page(query, order, cursor=[8, 2]).all()
+        self.assertEqual([(chore.created, chore.chore_id) for chore in chores], [(8, 3), (9, 4)])
+
+        chores = self.data.page(query, order, [False, True], limit=3).all()
+        self.assertEqual([(chore.created, chore.chore_id) for chore in chores], [(7, 1), (8, 3), (8, 2)])
+
+        chores = self.data.page(query, order, [False, True], cursor=chores[1]).all()
+        self.assertEqual([(chore.created, chore.chore_id) for chore in chores], [(8, 2), (9, 4)])
+
+        query = self.data.query(nandy.store.mysql.Chore, ["name", "created"])
+
+        rows = self.data.page(query, order, limit=2).all()
+        self.assertEqual(rows, [("Unit", 7, 1), ("Unit", 8, 2)])
+
+        rows = self.data.page(query, order, cursor=rows[-1]).all()
+        self.assertEqual(rows, [("Unit", 8, 3), ("Unit", 9, 4)])
+
+    def test_stream(self):
+
+        for created in [7, 8, 8, 9]:
+            self.sample.chore(person="kid", created=created)
+
+        order = [nandy.store.mysql.Chore.created, nandy.store.mysql.Chore.chore_id]
+        query = self.data.mysql.session.query(nandy.store.mysql.Chore)
+
+        with unittest.mock.patch.object(self.data, "page", wraps=self.data.page) as mock_page:
+            chores = list(self.data.stream(query, order, size=2, descending=True))
+
+        self.assertEqual([chore.chore_id for chore in chores], [4, 3, 2, 1])
+        self.assertEqual(mock_page.call_count, 3)
+
+        self.assertEqual([chore.chore_id for chore in self.data.stream(query, order, size=3)], [1, 2, 3, 4])
+
     # Person
 
     def test_person_create(self):
 
+        self.data.persons = {"unit": (0, 7)}
+
         created = self.data.person_create({
             "name": "unit",
             "email": "test",
         })
+        self.assertEqual(self.data.persons, {})
         self.assertEqual(created.name, "unit")
         self.assertEqual(created.email, "test")
 
@@ -43,6 +393,72 @@ class TestNandyData(unittest.TestCase):
         self.assertEqual(queried.name, "unit")
         self.assertEqual(queried.email, "test")
 
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_person_ids(self, mock_time):
+
+        mock_time.return_value = 7
+
+        unit = self.sample.person("unit")
+        test = self.sample.person("test")
+        self.sample.person("nope")
+
+        self.assertEqual(self.data.person_ids([]), {})
+        self.assertEqual(self.data.person_ids(["unit", "test"]), {
+            "unit": unit.person_id,
+            "test": test.person_id
+        })
+        self.assertEqual(self.data.persons, {
+            "unit": (unit.person_id, 7 + 60),
+            "test": (test.person_id, 7 + 60)
+        })
+
+        # Cached ones don't hit the database
+
+        self.data.mysql.session.query(nandy.store.mysql.Person).filter_by(name="unit").update({"name": "changed"})
+
+        self.assertEqual(self.data.person_ids(["unit"]), {"unit": unit.person_id})
+
+        # Until they expire
+
+        mock_time.return_value = 7 + 60
+
+        with self.assertRaises(sqlalchemy.orm.exc.NoResultFound):
+            self.data.person_ids(["unit", "test"])
+
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_person_id(self, mock_time):
+
+        mock_time.return_value = 7
+
+        unit = self.sample.person("unit")
+
+        self.assertEqual(self.data.person_id("unit"), unit.person_id)
+
+        with self.assertRaises(sqlalchemy.orm.exc.NoResultFound):
+            self.data.person_id("none")
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def test_person_forget(self):
+
+        self.data.persons.update({
+            "unit": (1, 7),
+            "test": (2, 7),
+            "again": (1, 7)
+        })
+
+        self.data.person_forget(1)
+        self.assertEqual(self.data.persons, {"test": (2, 7)})
+
+        # Everything on the same MySQL, like AsyncNandyData's threads, forgets too
+
+        other = nandy.data.NandyData(self.data.mysql)
+
+        self.assertIs(other.persons, self.data.persons)
+
+        other.person_forget(2)
+        self.assertEqual(self.data.persons, {})
+
     def test_person_list(self):
 
         self.sample.person("unit")
@@ -54,6 +470,14 @@ class TestNandyData(unittest.TestCase):
         
         persons = self.data.person_list({"name": "unit"})
         self.assertEqual(persons[0].name, "unit")
+
+        persons = self.data.person_list(limit=1)
+        self.assertEqual([person.name for person in persons], ["test"])
+
+        persons = self.data.person_list(limit=1, cursor=persons[-1])
+        self.assertEqual([person.name for person in persons], ["unit"])
+
+        self.assertEqual(self.data.person_list(fields=["person_id", "name"]), [(2, "test"), (1, "unit")])
         
     def test_person_retrieve(self):
 
@@ -66,8 +490,12 @@ class TestNandyData(unittest.TestCase):
 
         sample = self.sample.person("unit", "test")
 
+        self.data.persons = {"unit": (sample.person_id, 7)}
+
         self.data.person_update(sample.person_id, {"email": "testy"})
 
+        self.assertEqual(self.data.persons, {})
+
         queried = self.data.mysql.session.query(nandy.store.mysql.Person).one()
         self.assertEqual(queried.email, "testy")
 
@@ -75,7 +503,10 @@ class TestNandyData(unittest.TestCase):
 
         sample = self.sample.person("unit", "test")
 
+        self.data.persons = {"unit": (sample.person_id, 7)}
+
         self.assertEqual(self.data.person_delete(sample.person_id), 1)
+        self.assertEqual(self.data.persons, {})
         self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Person).all()), 0)
 
     # Area
@@ -110,6 +541,11 @@ class TestNandyData(unittest.TestCase):
         
         areas = self.data.area_list({"name": "unit"})
         self.assertEqual(areas[0].name, "unit")
+
+        areas = self.data.area_list(limit=1, cursor=["test", 2])
+        self.assertEqual([area.name for area in areas], ["unit"])
+
+        self.assertEqual(self.data.area_list(fields=["status"]), [("test", "test", 2), ("unit", "unit", 1)])
         
     def test_area_retrieve(self):
 
@@ -119,6 +555,21 @@ class TestNandyData(unittest.TestCase):
         self.assertEqual(retrieved.name, "unit")
         self.assertEqual(retrieved.data, {"a": 1})
 
+        # Cached, only the first goes to the database, till something changes
+
+        self.data.cache = nandy.store.cache.Cache()
+        self.data.mysql.session.expunge_all()
+        queries = self.queries()
+
+        self.assertEqual(self.data.area_retrieve(sample.area_id).name, "unit")
+        self.data.mysql.session.expunge_all()
+        self.assertEqual(self.data.area_retrieve(sample.area_id).name, "unit")
+        self.assertEqual(len(queries), 1)
+
+        self.data.area_update(sample.area_id, {"name": "test"})
+        self.data.mysql.session.expunge_all()
+        self.assertEqual(self.data.area_retrieve(sample.area_id).name, "test")
+
     def test_area_update(self):
 
         sample = self.sample.area(name="unit", status="test")
@@ -239,6 +690,29 @@ class TestNandyData(unittest.TestCase):
         
         templates = self.data.template_list({"name": "unit"})
         self.assertEqual(templates[0].name, "unit")
+
+        self.sample.template(name="unit", kind="act")
+
+        templates = self.data.template_list(limit=2, cursor=self.data.template_list(limit=1)[0])
+        self.assertEqual([(template.name, template.kind) for template in templates], [("unit", "chore"), ("unit", "act")])
+
+        templates = self.data.template_list(cursor=["unit", 1])
+        self.assertEqual([(template.name, template.kind) for template in templates], [("unit", "act")])
+
+        self.assertEqual(self.data.template_list({"name": "unit"}, fields=["kind"]), [("chore", "unit", 1), ("act", "unit", 3)])
+
+        # Cached, lists are by their arguments and cleared by creates
+
+        self.data.cache = nandy.store.cache.Cache()
+        queries = self.queries()
+
+        self.assertEqual(len(self.data.template_list()), 3)
+        self.assertEqual(len(self.data.template_list()), 3)
+        self.assertEqual(len(self.data.template_list({"kind": "act"})), 2)
+        self.assertEqual(len(queries), 2)
+
+        self.data.template_create({"name": "more", "kind": "act", "data": {}})
+        self.assertEqual(len(self.data.template_list()), 4)
         
     def test_template_retrieve(self):
 
@@ -248,6 +722,18 @@ class TestNandyData(unittest.TestCase):
         self.assertEqual(retrieved.name, "unit")
         self.assertEqual(retrieved.data, {"a": 1})
 
+        self.data.cache = nandy.store.cache.Cache()
+        self.data.mysql.session.expunge_all()
+        queries = self.queries()
+
+        self.assertEqual(self.data.template_retrieve(sample.template_id).data, {"a": 1})
+        self.data.mysql.session.expunge_all()
+        self.assertEqual(self.data.template_retrieve(sample.template_id).data, {"a": 1})
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(self.data.template_delete(sample.template_id), 1)
+        self.assertIsNone(self.data.template_retrieve(sample.template_id))
+
     def test_template_update(self):
 
         sample = self.sample.template(name="unit", kind="chore")
@@ -264,6 +750,80 @@ class TestNandyData(unittest.TestCase):
         self.assertEqual(self.data.template_delete(sample.template_id), 1)
         self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Template).all()), 0)
 
+    # Lease
+
+    def test_lease_acquire(self):
+
+        self.data.clock = lambda: 7
+
+        self.assertTrue(self.data.lease_acquire("unit", "one", 10))
+        self.assertFalse(self.data.lease_acquire("unit", "two", 10))
+
+        lease = self.data.mysql.session.query(nandy.store.mysql.Lease).one()
+        self.assertEqual((lease.holder, lease.expires), ("one", 17))
+
+        # Renewing
+
+        self.data.clock = lambda: 9
+
+        self.assertTrue(self.data.lease_acquire("unit", "one", 10))
+        self.data.mysql.session.refresh(lease)
+        self.assertEqual((lease.holder, lease.expires), ("one", 19))
+
+        # Expired, anyone can take it
+
+        self.data.clock = lambda: 19
+
+        self.assertTrue(self.data.lease_acquire("unit", "two", 10))
+        self.assertFalse(self.data.lease_acquire("unit", "one", 10))
+        self.data.mysql.session.refresh(lease)
+        self.assertEqual((lease.holder, lease.expires), ("two", 29))
+
+        # Others are separate
+
+        self.assertTrue(self.data.lease_acquire("test", "one", 10))
+
+    def test_lease_release(self):
+
+        self.data.clock = lambda: 7
+
+        self.data.lease_acquire("unit", "one", 10)
+
+        self.assertEqual(self.data.lease_release("unit", "two"), 0)
+        self.assertFalse(self.data.lease_acquire("unit", "two", 10))
+
+        self.assertEqual(self.data.lease_release("unit", "one"), 1)
+        self.assertTrue(self.data.lease_acquire("unit", "two", 10))
+
+    # Shard
+
+    def test_shard_name(self):
+
+        self.assertEqual(self.data.shard_name((1, 4)), "1/4")
+        self.assertEqual(self.data.shard_name(range(100, 200)), "100-200")
+
+    def test_shard_filter(self):
+
+        persons = [self.sample.person(f"kid{index}") for index in range(5)]
+
+        for person in persons:
+            self.sample.chore(person=person.name)
+
+        def shard(shard):
+            return sorted(
+                chore.person_id for chore in self.data.mysql.session.query(
+                    nandy.store.mysql.Chore
+                ).filter(
+                    self.data.shard_filter(shard)
+                )
+            )
+
+        ids = [person.person_id for person in persons]
+
+        self.assertEqual(shard((0, 2)), [id for id in ids if id % 2 == 0])
+        self.assertEqual(shard((1, 2)), [id for id in ids if id % 2 == 1])
+        self.assertEqual(shard(range(ids[1], ids[3])), ids[1:3])
+
     # Speak
 
     @unittest.mock.patch("nandy.data.time.time")
@@ -329,6 +889,101 @@ class TestNandyData(unittest.TestCase):
             "notified": 2
         }))
 
+        self.assertTrue(self.data.remind({
+            "interval": 5,
+            "notified": 2
+        }, 8))
+
+        self.assertTrue(self.data.remind({
+            "interval": 5
+        }))
+
+    def test_due(self):
+
+        self.assertIsNone(self.data.due({
+            "interval": 5,
+            "notified": 1,
+            "paused": True
+        }))
+
+        self.assertIsNone(self.data.due({
+            "notified": 1
+        }))
+
+        self.assertEqual(self.data.due({
+            "interval": 5,
+            "notified": 1
+        }), 6)
+
+        self.assertEqual(self.data.due({
+            "interval": 5,
+            "notified": 1,
+            "start": 1,
+            "delay": 10
+        }), 11)
+
+        self.assertEqual(self.data.due({
+            "interval": 5
+        }), 5)
+
+    def test_due_chore(self):
+
+        self.assertIsNone(self.data.due_chore({
+            "text": "chore it"
+        }))
+
+        self.assertEqual(self.data.due_chore({
+            "interval": 5,
+            "notified": 1.5
+        }), 6.5)
+
+        self.assertEqual(self.data.due_chore({
+            "interval": 10,
+            "notified": 1,
+            "tasks": [
+                {
+                    "start": 0,
+                    "end": 0,
+                    "interval": 1,
+                    "notified": 0
+                },
+                {
+                    "start": 0,
+                    "interval": 5,
+                    "notified": 0
+                },
+                {
+                    "start": 0,
+                    "interval": 1,
+                    "notified": 0
+                }
+            ]
+        }), 5)
+
+        self.assertEqual(self.data.due_chore({
+            "interval": 10,
+            "notified": 1
+        }, {
+            "start": 0,
+            "interval": 2,
+            "notified": 0
+        }), 2)
+
+    def test_schedule(self):
+
+        chore = self.sample.chore(person="kid", data={
+            "interval": 5,
+            "notified": 1
+        })
+
+        self.assertEqual(chore.due, 6)
+
+        chore.data["notified"] = 3
+        self.data.mysql.session.commit()
+
+        queried = self.data.mysql.session.query(nandy.store.mysql.Chore).one()
+        self.assertEqual(queried.due, 8)
+
     @unittest.mock.patch("nandy.data.time.time")
     def test_remind_task(self, mock_time):
 
@@ -359,87 +1014,348 @@ class TestNandyData(unittest.TestCase):
         self.data.mysql.session.add(chore)
         self.data.mysql.session.commit()
 
-        self.data.remind_task(chore)
-        self.assertEqual(dict(chore.data), {
-            "text": "chore it",
-            "language": "en-us",
-            "notified": 7,
-            "updated": 7,
-            "tasks": [
-                {
-                    "start": 0,
-                    "end": 0,
-                    "text": "no it",
-                    "interval": 5,
-                    "notified": 0
-                },
-                {
-                    "start": 0,
-                    "text": "do it",
-                    "interval": 5,
-                    "notified": 7
-                },
-                {
-                    "start": 0,
-                    "text": "to it",
-                    "interval": 5,
-                    "notified": 0
-                }
-            ]
-        })
-        self.assertEqual(len(self.data.speech.redis.messages), 1)
-        self.assertEqual(json.loads(self.data.speech.redis.messages[0]["data"]), {
-            "timestamp": 7,
-            "text": "kid, please do it",
-            "language": "en-us"
-        })
+        self.data.remind_task(chore)
+        self.assertEqual(dict(chore.data), {
+            "text": "chore it",
+            "language": "en-us",
+            "notified": 7,
+            "updated": 7,
+            "tasks": [
+                {
+                    "start": 0,
+                    "end": 0,
+                    "text": "no it",
+                    "interval": 5,
+                    "notified": 0
+                },
+                {
+                    "start": 0,
+                    "text": "do it",
+                    "interval": 5,
+                    "notified": 7
+                },
+                {
+                    "start": 0,
+                    "text": "to it",
+                    "interval": 5,
+                    "notified": 0
+                }
+            ]
+        })
+        self.assertEqual(len(self.data.speech.redis.messages), 1)
+        self.assertEqual(json.loads(self.data.speech.redis.messages[0]["data"]), {
+            "timestamp": 7,
+            "text": "kid, please do it",
+            "language": "en-us"
+        })
+
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_remind_chore(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = self.sample.chore(person="kid", data={
+            "interval": 5,
+            "notified": 0,
+            "tasks": [
+                {
+                    "start": 0,
+                    "text": "do it",
+                    "interval": 5,
+                    "notified": 0
+                }
+            ]
+        })
+
+        later = self.sample.chore(person="later", data={
+            "interval": 5,
+            "notified": 6
+        })
+
+        self.data.remind_chore()
+        queried = self.data.mysql.session.query(nandy.store.mysql.Chore).get(chore.chore_id)
+        self.assertEqual(dict(queried.data), {
+            "text": "chore it",
+            "language": "en-us",
+            "interval": 5,
+            "notified": 7,
+            "updated": 7,
+            "tasks": [
+                {
+                    "start": 0,
+                    "text": "do it",
+                    "interval": 5,
+                    "notified": 7
+                }
+            ]
+        })
+        self.assertEqual(len(self.data.speech.redis.messages), 2)
+        self.assertEqual(json.loads(self.data.speech.redis.messages[0]["data"]), {
+            "timestamp": 7,
+            "text": "kid, you still have to chore it",
+            "language": "en-us"
+        })
+        self.assertEqual(json.loads(self.data.speech.redis.messages[1]["data"]), {
+            "timestamp": 7,
+            "text": "kid, please do it",
+            "language": "en-us"
+        })
+        self.assertEqual(queried.due, 12)
+        self.assertEqual(self.data.speech.redis.executed, 1)
+
+        # Chores without a due, never due or never scheduled, aren't even loaded
+
+        never = self.sample.chore(person="never", data={"text": "chore it"})
+        self.assertIsNone(never.due)
+
+        later_id = later.chore_id
+        kid_id = chore.person_id
+
+        self.data.mysql.session.query(nandy.store.mysql.Chore).filter_by(chore_id=later_id).update({"due": None})
+        self.data.mysql.session.commit()
+        self.data.mysql.session.expunge_all()
+
+        loaded = []
+
+        def load(target, context):
+            loaded.append(target.chore_id)
+
+        sqlalchemy.event.listen(nandy.store.mysql.Chore, "load", load)
+
+        try:
+            self.data.remind_chore()
+        finally:
+            sqlalchemy.event.remove(nandy.store.mysql.Chore, "load", load)
+
+        self.assertEqual(loaded, [])
+        self.assertIsNone(self.data.mysql.session.query(nandy.store.mysql.Chore).get(later_id).due)
+        self.assertEqual(len(self.data.speech.redis.messages), 2)
+
+        self.data.remind_schedule()
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Chore).get(later_id).due, 11)
+
+        # Due but not reminding anything doesn't write anything
+
+        updates = []
+        sqlalchemy.event.listen(self.data.mysql.engine, "before_cursor_execute", lambda *args: updates.append(args[2]) if args[2].startswith("UPDATE") else None)
+
+        self.sample.chore(person="now", data={
+            "interval": 1,
+            "notified": 6
+        })
+        del updates[:]
+
+        self.data.remind_chore()
+        self.assertEqual(updates, [])
+        self.assertEqual(len(self.data.speech.redis.messages), 2)
+
+        # One look at the clock for the whole pass
+
+        clock = unittest.mock.MagicMock(return_value=20)
+        self.data.clock = clock
+
+        self.data.remind_chore()
+        self.assertEqual(clock.call_count, 1)
+        self.assertEqual(len(self.data.speech.redis.messages), 6)
+        self.assertEqual({json.loads(message["data"])["timestamp"] for message in self.data.speech.redis.messages[2:]}, {20})
+
+        # Just a shard's
+
+        clock.return_value = 40
+
+        self.data.remind_chore(range(kid_id, kid_id + 1))
+        self.assertEqual([json.loads(message["data"])["text"] for message in self.data.speech.redis.messages[6:]], [
+            "kid, you still have to chore it",
+            "kid, please do it"
+        ])
+
+        # Nothing's said if what it notified can't be saved, so it's all
+        # still there to say next time
+
+        clock.return_value = 50
+
+        with unittest.mock.patch.object(self.data.mysql.session, "commit", side_effect=Exception("whoops")), \
+             self.assertRaises(Exception):
+            self.data.remind_chore()
+
+        self.assertEqual(len(self.data.speech.redis.messages), 8)
+
+        self.data.remind_chore(range(kid_id, kid_id + 1))
+        self.assertEqual([json.loads(message["data"])["text"] for message in self.data.speech.redis.messages[8:]], [
+            "kid, you still have to chore it",
+            "kid, please do it"
+        ])
+
+    def test_remind_schedule(self):
+
+        self.sample.chore(person="kid", data={"interval": 5, "notified": 6})
+        self.sample.chore(person="kid", name="Never", data={"text": "chore it"})
+        self.sample.chore(person="kid", name="Ended", status="ended", data={"interval": 5, "notified": 1})
+
+        self.data.mysql.session.query(nandy.store.mysql.Chore).update({"due": None})
+        self.data.mysql.session.commit()
+
+        self.assertEqual(self.data.remind_schedule(), 1)
+
+        self.data.mysql.session.expire_all()
+        self.assertEqual(
+            [(queried.name, queried.due) for queried in self.data.mysql.session.query(nandy.store.mysql.Chore).order_by("chore_id")],
+            [("Unit", 11), ("Never", None), ("Ended", None)]
+        )
+
+    def test_remind_next(self):
+
+        self.assertIsNone(self.data.remind_next())
+        self.assertIsNone(self.data.remind_next((0, 1)))
+
+        self.sample.chore(person="kid", data={"text": "chore it"})
+        self.assertIsNone(self.data.remind_next())
+
+        self.sample.chore(person="kid", name="Later", data={"interval": 5, "notified": 6})
+        self.sample.chore(person="kid", name="Sooner", data={"interval": 5, "notified": 3})
+        self.sample.chore(person="kid", name="Ended", status="ended", data={"interval": 5, "notified": 1})
+
+        self.assertEqual(self.data.remind_next(), 8)
+
+        # Just the shard's
+
+        other = self.sample.chore(person="other", name="Soonest", data={"interval": 5, "notified": 2})
+        kid = self.data.person_id("kid")
+
+        self.assertEqual(self.data.remind_next(range(kid, kid + 1)), 8)
+        self.assertEqual(self.data.remind_next(range(other.person_id, other.person_id + 1)), 7)
+
+    # Tasks
+
+    def test_tasks(self):
+
+        chore = self.sample.chore(person="kid", tasks=[{"text": "do it"}])
+        self.assertIs(self.data.tasks(chore), chore.data["tasks"])
+
+        chore = self.sample.chore(person="kid", name="Test")
+        self.assertIsNone(self.data.tasks(chore))
+
+        chore.tasks = nandy.store.mysql.task_rows([{"text": "do it"}, {"text": "did it"}])
+        self.assertEqual(self.data.tasks(chore), [{"text": "do it"}, {"text": "did it"}])
+        self.assertIsInstance(self.data.tasks(chore)[0], nandy.store.mysql.TaskData)
+
+    def test_active(self):
+
+        chore = self.sample.chore(person="kid", tasks=[
+            {"text": "no it", "start": 0, "end": 0},
+            {"text": "do it", "start": 0},
+            {"text": "to it", "start": 0}
+        ])
+        self.assertIs(self.data.active(chore), chore.data["tasks"][1])
+
+        chore = self.sample.chore(person="kid", name="Data", tasks=[{"text": "do it"}])
+        self.assertIsNone(self.data.active(chore))
+
+        chore = self.sample.chore(person="kid", name="Test")
+        chore.tasks = nandy.store.mysql.task_rows([{"text": "do it"}, {"text": "did it"}])
+        self.data.mysql.session.commit()
+
+        self.assertIsNone(self.data.active(chore))
+
+        chore.active = 1
+        active = self.data.active(chore)
+        self.assertEqual(active, {"text": "did it"})
+
+        # Straight from the session, no scanning
+
+        queries = self.queries()
+        self.assertIs(self.data.active(chore).task, active.task)
+        self.assertEqual(queries, [])
+
+    def test_normalize(self):
+
+        chore = nandy.store.mysql.Chore(data={"text": "chore it", "tasks": [{"text": "do it"}]})
+
+        self.data.normalize(chore)
+        self.assertEqual(chore.data, {"text": "chore it", "tasks": [{"text": "do it"}]})
+        self.assertEqual(chore.tasks, [])
+
+        self.data.task_table = True
+
+        self.data.normalize(chore)
+        self.assertEqual(chore.data, {"text": "chore it"})
+        self.assertEqual([task.text for task in chore.tasks], ["do it"])
+
+        chore = nandy.store.mysql.Chore(data={"text": "chore it", "tasks": []})
+        self.data.normalize(chore)
+        self.assertEqual(chore.data, {"text": "chore it", "tasks": []})
 
     @unittest.mock.patch("nandy.data.time.time")
-    def test_remind_chore(self, mock_time):
+    def test_task_table(self, mock_time):
 
         mock_time.return_value = 7
 
-        chore = self.sample.chore(person="kid", data={
-            "interval": 5,
-            "notified": 0,
-            "tasks": [
-                {
-                    "start": 0,
-                    "text": "do it",
-                    "interval": 5,
-                    "notified": 0
-                }
-            ]
-        })
+        self.data.task_table = True
+        self.sample.person("kid")
 
-        self.data.remind_chore()
-        queried = self.data.mysql.session.query(nandy.store.mysql.Chore).one()
-        self.assertEqual(dict(queried.data), {
+        chore = self.data.chore_create(template={
+            "person": "kid",
+            "name": "Unit",
             "text": "chore it",
-            "language": "en-us",
-            "interval": 5,
-            "notified": 7,
-            "updated": 7,
             "tasks": [
-                {
-                    "start": 0,
-                    "text": "do it",
-                    "interval": 5,
-                    "notified": 7
-                }
+                {"text": "do it", "interval": 5},
+                {"text": "did it", "interval": 5}
             ]
         })
-        self.assertEqual(len(self.data.speech.redis.messages), 2)
-        self.assertEqual(json.loads(self.data.speech.redis.messages[0]["data"]), {
-            "timestamp": 7,
-            "text": "kid, you still have to chore it",
-            "language": "en-us"
-        })
-        self.assertEqual(json.loads(self.data.speech.redis.messages[1]["data"]), {
-            "timestamp": 7,
-            "text": "kid, please do it",
-            "language": "en-us"
-        })
+
+        self.assertNotIn("tasks", chore.data)
+        self.assertEqual(chore.active, 0)
+        self.assertEqual(chore.due, 12)
+        self.assertEqual(dict(self.data.active(chore)), {"id": 0, "text": "do it", "start": 7, "notified": 7, "interval": 5})
+
+        # Reminders go to the active task
+
+        mock_time.return_value = 13
+        self.data.remind_chore()
+
+        self.assertEqual(self.data.active(chore)["notified"], 13)
+        self.assertEqual(chore.due, 18)
+        self.assertEqual(json.loads(self.data.speech.redis.messages[-1]["data"])["text"], "kid, please do it")
+
+        # Completing a task only touches it, its chore and the next
+
+        mock_time.return_value = 14
+        queries = self.queries()
+
+        self.assertTrue(self.data.chore_next(chore))
+
+        self.assertEqual(chore.active, 1)
+        self.assertEqual(chore.due, 19)
+        self.assertEqual(sorted(set(
+            statement.split()[1] for statement in queries if statement.startswith("UPDATE")
+        )), ["chore", "task"])
+        self.assertFalse([statement for statement in queries if statement.split()[0] in ["INSERT", "DELETE"]])
+
+        self.data.mysql.session.expire_all()
+        self.assertEqual([(task.start, task.end) for task in chore.tasks], [(7, 14), (14, None)])
+
+        # Undoing and finishing
+
+        self.assertTrue(self.data.task_incomplete(self.data.tasks(chore)[0], chore))
+        self.assertEqual(chore.active, 0)
+
+        self.assertTrue(self.data.chore_next(chore))
+        self.assertTrue(self.data.chore_next(chore))
+        self.assertIsNone(chore.active)
+        self.assertEqual(chore.status, "ended")
+        self.assertFalse(self.data.chore_next(chore))
+
+        # Data updates still schedule by the active task
+
+        self.assertTrue(self.data.task_unskip(self.data.tasks(chore)[1], chore) is False)
+        self.assertTrue(self.data.task_incomplete(self.data.tasks(chore)[1], chore))
+        self.data.chore_update(chore.chore_id, {"data": {"text": "chore it", "interval": 100, "notified": 0}})
+
+        self.data.mysql.session.expire_all()
+        self.assertEqual(chore.due, 19)
+
+        self.assertEqual(self.data.chore_delete(chore.chore_id), 1)
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Task).count(), 0)
 
     # Chore
 
@@ -548,6 +1464,80 @@ class TestNandyData(unittest.TestCase):
             "updated": 7
         })
 
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_chore_create_many(self, mock_time):
+
+        mock_time.return_value = 7
+
+        unit = self.sample.person("unit")
+        test = self.sample.person("test")
+
+        with unittest.mock.patch.object(self.data.mysql.session, "commit", wraps=self.data.mysql.session.commit) as mock_commit:
+
+            created = self.data.chore_create_many([
+                {
+                    "template": {
+                        "person": "unit",
+                        "name": "Unit",
+                        "text": "chore it",
+                        "tasks": [
+                            {
+                                "text": "do it"
+                            }
+                        ]
+                    }
+                },
+                {
+                    "template": {
+                        "person": "test",
+                        "name": "Test",
+                        "text": "chore it"
+                    }
+                },
+                {
+                    "fields": {
+                        "person_id": unit.person_id,
+                        "name": "Fielded",
+                        "data": {
+                            "text": "field it"
+                        }
+                    }
+                }
+            ])
+
+            mock_commit.assert_called_once_with()
+
+        self.assertEqual([chore.name for chore in created], ["Unit", "Test", "Fielded"])
+        self.assertEqual([chore.person_id for chore in created], [unit.person_id, test.person_id, unit.person_id])
+
+        queried = self.data.mysql.session.query(nandy.store.mysql.Chore).get(created[0].chore_id)
+        self.assertEqual(queried.status, "started")
+        self.assertEqual(dict(queried.data), {
+            "person": "unit",
+            "name": "Unit",
+            "text": "chore it",
+            "language": "en-us",
+            "start": 7,
+            "notified": 7,
+            "updated": 7,
+            "tasks": [
+                {
+                    "id": 0,
+                    "text": "do it",
+                    "start": 7,
+                    "notified": 7
+                }
+            ]
+        })
+
+        self.assertEqual(self.data.speech.redis.executed, 1)
+        self.assertEqual([json.loads(message["data"])["text"] for message in self.data.speech.redis.messages], [
+            "unit, time to chore it",
+            "unit, please do it",
+            "test, time to chore it",
+            "unit, time to field it"
+        ])
+
     def test_chore_list(self):
 
         self.sample.chore(person="unit", name="Unit", created=7)
@@ -560,6 +1550,43 @@ class TestNandyData(unittest.TestCase):
         chores = self.data.chore_list({"name": "Unit"})
         self.assertEqual(chores[0].name, "Unit")
 
+        self.sample.chore(person="unit", name="Again", created=8)
+
+        chores = self.data.chore_list(limit=2)
+        self.assertEqual([chore.name for chore in chores], ["Again", "Test"])
+
+        chores = self.data.chore_list(limit=2, cursor=chores[-1])
+        self.assertEqual([chore.name for chore in chores], ["Unit"])
+
+        chores = self.data.chore_list({"person_id": chores[0].person_id}, cursor=[8, 3])
+        self.assertEqual([chore.name for chore in chores], ["Unit"])
+
+        rows = self.data.chore_list({"status": "started"}, limit=2, fields=["chore_id", "name", "status", "created"])
+        self.assertEqual(rows, [(3, "Again", "started", 8), (2, "Test", "started", 8)])
+
+        rows = self.data.chore_list(cursor=rows[-1], fields=["name"])
+        self.assertEqual(rows, [("Unit", 7, 1)])
+
+        chores = self.data.chore_list({"created__gte": 8, "name__in": ["Unit", "Test"]})
+        self.assertEqual([chore.name for chore in chores], ["Test"])
+
+        chores = self.data.chore_list(order=["name"], limit=2)
+        self.assertEqual([chore.name for chore in chores], ["Again", "Test"])
+
+        chores = self.data.chore_list(order=["name"], cursor=chores[-1])
+        self.assertEqual([chore.name for chore in chores], ["Unit"])
+
+    def test_chore_stream(self):
+
+        self.sample.chore(person="unit", name="Unit", created=7)
+        self.sample.chore(person="test", name="Test", created=8)
+        self.sample.chore(person="unit", name="Again", created=8)
+
+        self.assertEqual([chore.name for chore in self.data.chore_stream(size=2)], ["Again", "Test", "Unit"])
+        self.assertEqual([chore.name for chore in self.data.chore_stream({"name": "Unit"})], ["Unit"])
+        self.assertEqual([row.name for row in self.data.chore_stream(size=2, fields=["name"])], ["Again", "Test", "Unit"])
+        self.assertEqual([chore.name for chore in self.data.chore_stream({"created__lt": 8}, order=["created"])], ["Unit"])
+
     def test_chore_retrieve(self):
 
         sample = self.sample.chore(person="unit", name="Unit", data={
@@ -583,6 +1610,11 @@ class TestNandyData(unittest.TestCase):
         queried = self.data.mysql.session.query(nandy.store.mysql.Chore).one()
         self.assertEqual(queried.name, "Unit")
 
+        self.data.chore_update(sample.chore_id, {"data": {"interval": 5, "notified": 2}})
+
+        queried = self.data.mysql.session.query(nandy.store.mysql.Chore).one()
+        self.assertEqual(queried.due, 7)
+
     @unittest.mock.patch("nandy.data.time.time")
     def test_chore_check(self, mock_time):
 
@@ -1291,6 +2323,70 @@ class TestNandyData(unittest.TestCase):
         self.assertEqual(fielded.created, 7)
         self.assertEqual(fielded.value, "positive")
 
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_act_create_many(self, mock_time):
+
+        mock_time.return_value = 7
+
+        unit = self.sample.person("unit")
+        test = self.sample.person("test")
+
+        created = self.data.act_create_many([
+            {
+                "template": {
+                    "person": "unit",
+                    "name": "Unit",
+                    "value": "negative",
+                    "chore": {
+                        "name": "Chore",
+                        "text": "chore it"
+                    }
+                }
+            },
+            {
+                "template": {
+                    "person": "test",
+                    "name": "Test",
+                    "value": "positive"
+                }
+            },
+            {
+                "fields": {
+                    "person_id": unit.person_id,
+                    "name": "Fielded",
+                    "value": "positive",
+                    "data": {}
+                }
+            }
+        ])
+
+        self.assertEqual([act.name for act in created], ["Unit", "Test", "Fielded"])
+        self.assertEqual([act.person_id for act in created], [unit.person_id, test.person_id, unit.person_id])
+        self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Act).all()), 3)
+
+        chore = self.data.mysql.session.query(nandy.store.mysql.Chore).one()
+        self.assertEqual(chore.person_id, unit.person_id)
+        self.assertEqual(chore.name, "Chore")
+
+        self.assertEqual(self.data.graphite.sender.sockets, 1)
+        self.assertEqual(self.data.graphite.sender.messages, [
+            {
+                "name": "person.unit.act.Unit",
+                "value": -1,
+                "timestamp": 7
+            },
+            {
+                "name": "person.test.act.Test",
+                "value": 1,
+                "timestamp": 7
+            },
+            {
+                "name": "person.unit.act.Fielded",
+                "value": 1,
+                "timestamp": 7
+            }
+        ])
+
     def test_act_list(self):
 
         self.sample.act(person="unit", name="Unit", created=7)
@@ -1303,6 +2399,33 @@ class TestNandyData(unittest.TestCase):
         acts = self.data.act_list({"name": "Unit"})
         self.assertEqual(acts[0].name, "Unit")
 
+        self.sample.act(person="unit", name="Again", created=8)
+
+        acts = self.data.act_list(limit=2)
+        self.assertEqual([act.name for act in acts], ["Again", "Test"])
+
+        acts = self.data.act_list(limit=2, cursor=acts[-1])
+        self.assertEqual([act.name for act in acts], ["Unit"])
+
+        self.assertEqual(self.data.act_list({"name": "Unit"}, fields=["name", "value"]), [("Unit", "positive", 7, 1)])
+
+        acts = self.data.act_list({"person_id": acts[0].person_id, "created__gte": 8})
+        self.assertEqual([act.name for act in acts], ["Again"])
+
+        acts = self.data.act_list(order=["created"], limit=1)
+        self.assertEqual([act.name for act in acts], ["Unit"])
+
+    def test_act_stream(self):
+
+        self.sample.act(person="unit", name="Unit", created=7)
+        self.sample.act(person="test", name="Test", created=8)
+        self.sample.act(person="unit", name="Again", created=8)
+
+        self.assertEqual([act.name for act in self.data.act_stream(size=2)], ["Again", "Test", "Unit"])
+        self.assertEqual([act.name for act in self.data.act_stream({"name": "Unit"})], ["Unit"])
+        self.assertEqual([row.name for row in self.data.act_stream(size=2, fields=["name"])], ["Again", "Test", "Unit"])
+        self.assertEqual([act.name for act in self.data.act_stream({"name__ne": "Test"}, order=["name"])], ["Again", "Unit"])
+
     def test_act_retrieve(self):
 
         sample = self.sample.act(person="kid", name='Unit', value="positive", created=7, data={"a": 1})
@@ -1325,3 +2448,154 @@ class TestNandyData(unittest.TestCase):
 
         self.assertEqual(self.data.act_delete(sample.act_id), 1)
         self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Act).all()), 0)
+
+
+class TestAsyncNandyData(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        nandy.store.mysql.create_database()
+
+        # Shared so the tables are there even in memory
+
+        self.mysql = nandy.store.mysql.MySQL()
+        nandy.store.mysql.Base.metadata.create_all(self.mysql.engine)
+        self.mysql.session.close()
+
+        self.data = nandy.data.AsyncNandyData(workers=2, mysql=self.mysql)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+
+        self.data.close()
+        self.loop.close()
+
+    def test___init__(self):
+
+        self.assertIs(self.data.mysql, self.mysql)
+        self.assertFalse(self.mysql.Session.kw["expire_on_commit"])
+
+        init = nandy.data.AsyncNandyData(workers=3, url="sqlite://", pool_recycle=60)
+
+        self.assertEqual(str(init.mysql.engine.url), "sqlite://")
+        self.assertEqual(init.mysql.engine.pool._recycle, 60)
+        self.assertFalse(init.mysql.Session.kw["expire_on_commit"])
+
+        init.close()
+
+        init = nandy.data.AsyncNandyData(host="unit", port=7, max_overflow=2)
+
+        self.assertEqual(str(init.mysql.engine.url), "mysql+pymysql://root@unit:7/nandy")
+        self.assertEqual(init.mysql.engine.pool.size(), 4)
+        self.assertEqual(init.mysql.engine.pool._max_overflow, 2)
+
+        init.close()
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def test_data(self):
+
+        cache = nandy.store.cache.Cache()
+        self.data.cache = cache
+
+        data = self.data.data()
+
+        self.assertIs(data.mysql, self.data.mysql)
+        self.assertIs(data.cache, cache)
+        self.assertIs(self.data.data(), data)
+
+        others = []
+        thread = threading.Thread(target=lambda: others.append(self.data.data()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(others[0], data)
+        self.assertIs(others[0].cache, cache)
+        self.assertIs(others[0].persons, data.persons)
+
+        # Everything else goes to every thread's NandyData
+
+        graphite = nandy.store.graphite.Graphite()
+        instrument = nandy.instrument.Instrument()
+
+        self.data.local = threading.local()
+        self.data.person_ttl = 30
+        self.data.graphite = graphite
+        self.data.instrument = instrument
+        self.data.task_table = True
+
+        data = self.data.data()
+
+        self.assertEqual(data.person_ttl, 30)
+        self.assertIs(data.graphite, graphite)
+        self.assertIs(data.instrument, instrument)
+        self.assertTrue(data.task_table)
+
+        thread = threading.Thread(target=lambda: others.append(self.data.data()))
+        thread.start()
+        thread.join()
+
+        # Measured the once, however many threads share it
+
+        graphite.send("a", 1, 7)
+
+        self.assertEqual(instrument.sink.totals["graphite.send"]["calls"], 1)
+
+    def test___getattr__(self):
+
+        self.assertEqual(self.data.chore_create.__name__, "chore_create")
+
+        with self.assertRaises(AttributeError):
+            self.data.remind
+
+        with self.assertRaises(AttributeError):
+            self.data.chore_nope
+
+        with self.assertRaises(AttributeError):
+            self.data.chore_stream
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis) 
+    def test_call(self):
+
+        async def run():
+
+            await self.data.person_create({"name": "kid", "email": "kid"})
+
+            chore = await self.data.chore_create(template={
+                "person": "kid",
+                "name": "Unit",
+                "text": "chore it",
+                "tasks": [
+                    {
+                        "text": "do it"
+                    }
+                ]
+            })
+
+            self.assertTrue(await self.data.chore_next(chore))
+
+            await self.data.act_create(template={
+                "person": "kid",
+                "name": "Unit",
+                "value": "positive"
+            })
+
+            return await asyncio.gather(*[self.data.chore_list() for _ in range(3)]), await self.data.act_list()
+
+        chore_lists, acts = self.loop.run_until_complete(run())
+
+        for chores in chore_lists:
+            self.assertEqual(len(chores), 1)
+            self.assertEqual(chores[0].name, "Unit")
+            self.assertEqual(chores[0].status, "ended")
+
+            # The person comes along, as the session it'd load from is gone
+
+            self.assertEqual(chores[0].person.name, "kid")
+            self.assertIn("person='kid'", repr(chores[0]))
+
+        self.assertEqual(acts[0].person.name, "kid")
+        self.assertIn("person='kid'", repr(acts[0]))
@@ -0,0 +1,137 @@
+import unittest
+import unittest.mock
+
+import os
+import logging
+
+import nandy.data
+import nandy.instrument
+import nandy.store.graphite
+import nandy.store.redis
+import nandy.store.mysql
+
+
+class TestMemorySink(unittest.TestCase):
+
+    def test_record(self):
+
+        sink = nandy.instrument.MemorySink()
+
+        sink.record("unit", 1, 2)
+        sink.record("unit", 3, 4)
+
+        self.assertEqual(list(sink.records), [
+            {"name": "unit", "duration": 1, "queries": 2},
+            {"name": "unit", "duration": 3, "queries": 4}
+        ])
+        self.assertEqual(sink.totals, {"unit": {"calls": 2, "duration": 4, "queries": 6}})
+
+        # Only the latest records, but totals for all of them
+
+        sink = nandy.instrument.MemorySink(size=1)
+
+        sink.record("unit", 1, 2)
+        sink.record("unit", 3, 4)
+
+        self.assertEqual(list(sink.records), [{"name": "unit", "duration": 3, "queries": 4}])
+        self.assertEqual(sink.totals, {"unit": {"calls": 2, "duration": 4, "queries": 6}})
+
+
+class TestLogSink(unittest.TestCase):
+
+    def test_record(self):
+
+        sink = nandy.instrument.LogSink(level=logging.INFO)
+
+        with self.assertLogs("nandy", logging.INFO) as logs:
+            sink.record("unit", 1, 2)
+
+        self.assertEqual(logs.output, ["INFO:nandy:unit took 1.000000s and 2 queries"])
+
+
+class TestGraphiteSink(unittest.TestCase):
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("nandy.instrument.time.time")
+    def test_record(self, mock_time):
+
+        mock_time.return_value = 7
+
+        sink = nandy.instrument.GraphiteSink(nandy.store.graphite.Graphite())
+        sink.record("task_complete", 1, 2)
+
+        self.assertEqual(sink.graphite.sender.messages, [
+            {"name": "instrument.task_complete.duration", "value": 1, "timestamp": 7},
+            {"name": "instrument.task_complete.queries", "value": 2, "timestamp": 7}
+        ])
+
+
+class TestInstrument(unittest.TestCase):
+
+    maxDiff = None
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis) 
+    def setUp(self):
+
+        nandy.store.mysql.create_database()
+
+        self.instrument = nandy.instrument.Instrument()
+        self.data = nandy.data.NandyData(instrument=self.instrument)
+        self.sample = nandy.store.mysql.Sample(self.data.mysql.session)
+        nandy.store.mysql.Base.metadata.create_all(self.data.mysql.engine)
+
+    def tearDown(self):
+
+        self.data.mysql.session.close()
+
+    def test___init__(self):
+
+        self.assertIsInstance(nandy.instrument.Instrument().sink, nandy.instrument.MemorySink)
+
+    def test_measure(self):
+
+        with self.instrument.measure("unit") as frame:
+            frame["queries"] = 3
+
+        self.assertEqual(self.instrument.sink.records[-1]["name"], "unit")
+        self.assertEqual(self.instrument.sink.records[-1]["queries"], 3)
+        self.assertEqual(self.instrument.stack(), [])
+
+    def test_wrap(self):
+
+        wrapped = self.instrument.wrap("unit", lambda value: value + 1)
+
+        self.assertEqual(wrapped(1), 2)
+        self.assertEqual(self.instrument.sink.records[-1]["name"], "unit")
+
+    def test_record(self):
+
+        self.instrument.sink = unittest.mock.MagicMock()
+        self.instrument.sink.record.side_effect = lambda *args: self.instrument.record("again", 0, 0)
+
+        self.instrument.record("unit", 1, 2)
+
+        self.instrument.sink.record.assert_called_once_with("unit", 1, 2)
+
+    def test_attach(self):
+
+        self.sample.chore(person="kid", data={"start": 1}, tasks=[{"text": "do it"}, {"text": "did it"}])
+        chore = self.data.chore_retrieve(1)
+
+        self.instrument.sink.records.clear()
+        self.instrument.sink.totals.clear()
+
+        self.data.task_complete(chore.data["tasks"][0], chore)
+
+        totals = self.instrument.sink.totals
+
+        self.assertEqual(totals["task_complete"]["calls"], 1)
+        self.assertGreater(totals["task_complete"]["queries"], 0)
+        self.assertEqual(totals["task_complete"]["queries"], totals["mysql.query"]["calls"])
+        self.assertEqual(totals["chore_check"]["calls"], 1)
+        self.assertEqual(totals["speech.publish"]["calls"], 2)
+        self.assertEqual(totals["graphite.send"]["calls"], 1)
+        self.assertNotIn("commit", totals)
+        self.assertNotIn("transaction", totals)
+        self.assertNotIn("active", totals)
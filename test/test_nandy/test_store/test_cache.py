@@ -0,0 +1,102 @@
+import unittest
+import unittest.mock
+
+import nandy.store.redis
+import nandy.store.cache
+
+class TestNandyCache(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.cache = nandy.store.cache.Cache(size=2)
+
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def test___init__(self):
+
+        self.assertEqual(self.cache.size, 2)
+        self.assertEqual(self.cache.prefix, "nandy")
+        self.assertIsNone(self.cache.redis)
+
+        init = nandy.store.cache.Cache(shared=True, prefix="unit")
+
+        self.assertEqual(init.size, 1024)
+        self.assertEqual(init.prefix, "unit")
+        self.assertEqual(init.redis.host, "redis")
+        self.assertEqual(init.redis.port, 6379)
+
+        init = nandy.store.cache.Cache(shared=True, host="unit", port=7)
+
+        self.assertEqual(init.redis.host, "unit")
+        self.assertEqual(init.redis.port, 7)
+
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def test_version(self):
+
+        self.assertEqual(self.cache.version("area"), 0)
+        self.cache.versions["area"] = 2
+        self.assertEqual(self.cache.version("area"), 2)
+
+        shared = nandy.store.cache.Cache(shared=True)
+
+        self.assertEqual(shared.version("area"), 0)
+        shared.redis.data["nandy/cache/area"] = b"3"
+        self.assertEqual(shared.version("area"), 3)
+
+    def test_fetch(self):
+
+        load = unittest.mock.MagicMock(side_effect=[1, 2, 3, 4])
+
+        self.assertEqual(self.cache.fetch("area", "a", load), 1)
+        self.assertEqual(self.cache.fetch("area", "a", load), 1)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+        # Least recently used goes
+
+        self.assertEqual(self.cache.fetch("template", "a", load), 2)
+        self.assertEqual(self.cache.fetch("area", "a", load), 1)
+        self.assertEqual(self.cache.fetch("area", "b", load), 3)
+        self.assertEqual(list(self.cache.entries.keys()), [("area", "a"), ("area", "b")])
+
+        # Stale versions reload
+
+        self.cache.versions["area"] = 1
+        self.assertEqual(self.cache.fetch("area", "a", load), 4)
+
+        # Nothing's still something
+
+        load = unittest.mock.MagicMock(return_value=None)
+
+        self.assertIsNone(self.cache.fetch("area", "c", load))
+        self.assertIsNone(self.cache.fetch("area", "c", load))
+        self.assertEqual(load.call_count, 1)
+
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def test_clear(self):
+
+        self.cache.fetch("area", "a", lambda: 1)
+        self.cache.fetch("template", "a", lambda: 2)
+
+        self.cache.clear("area")
+
+        self.assertEqual(self.cache.versions, {"area": 1})
+        self.assertEqual(list(self.cache.entries.keys()), [("template", "a")])
+        self.assertEqual(self.cache.fetch("area", "a", lambda: 3), 3)
+
+        # Shared clears everyone's
+
+        one = nandy.store.cache.Cache(shared=True)
+        two = nandy.store.cache.Cache(shared=True)
+        two.redis = one.redis
+
+        one.fetch("area", "a", lambda: 1)
+        two.fetch("area", "a", lambda: 2)
+
+        two.clear("area")
+
+        self.assertEqual(one.redis.data, {"nandy/cache/area": b"1"})
+        self.assertEqual(one.fetch("area", "a", lambda: 3), 3)
+        self.assertEqual(two.fetch("area", "a", lambda: 4), 4)
@@ -2,7 +2,9 @@ import unittest
 import unittest.mock
 
 import os
+import time
 import json
+import threading
 
 import graphyte
 
@@ -29,6 +31,20 @@ class TestNandyGraphite(unittest.TestCase):
         self.assertEqual(init.sender.host, "unit")
         self.assertEqual(init.sender.port, 7)
         self.assertEqual(init.sender.prefix, "test")
+        self.assertIsNone(init.interval)
+        self.assertIsNone(init.thread)
+
+        init = nandy.store.graphite.Graphite("unit", 7, "test", interval=60, size=10)
+
+        self.assertEqual(init.interval, 60)
+        self.assertEqual(init.size, 10)
+        self.assertTrue(init.thread.is_alive())
+
+        init.stop()
+
+    def test_sanitize(self):
+
+        self.assertEqual(nandy.store.graphite.sanitize("totally $^&*& cray"), "totally_cray")
 
     def test_send(self):
 
@@ -38,3 +54,200 @@ class TestNandyGraphite(unittest.TestCase):
             "value": 1,
             "timestamp": 7
         }])
+
+        self.assertEqual(self.graphite.sent, 1)
+        self.assertEqual(self.graphite.flushed, 1)
+
+        self.graphite.batching = 1
+        self.graphite.send("batched", 2, 8)
+
+        self.assertEqual(len(self.graphite.sender.messages), 1)
+        self.assertEqual(self.graphite.held, [self.graphite.sender.build_message("batched", 2, 8)])
+        self.assertEqual(self.graphite.queue, [])
+        self.assertEqual(self.graphite.sent, 1)
+
+        # With an interval, it's queued for the thread
+
+        self.graphite.batching = 0
+        self.graphite.interval = 60
+        self.graphite.send("queued", 2, 8)
+
+        self.assertEqual(self.graphite.queue, [self.graphite.sender.build_message("queued", 2, 8)])
+        self.assertEqual(self.graphite.sent, 2)
+
+        # Full queues drop
+
+        self.graphite.size = 1
+        self.graphite.send("dropped", 3, 9)
+
+        self.assertEqual(self.graphite.queue, [self.graphite.sender.build_message("queued", 2, 8)])
+        self.assertEqual(self.graphite.sent, 2)
+        self.assertEqual(self.graphite.dropped, 1)
+
+        # Bad values fail for the sender however it's sending
+
+        self.graphite.size = None
+
+        with self.assertRaises(TypeError):
+            self.graphite.send("a", None, 1)
+
+        self.graphite.batching = 1
+
+        with self.assertRaises(TypeError):
+            self.graphite.send("a", None, 1)
+
+        self.graphite.batching = 0
+        self.graphite.interval = None
+
+        with self.assertRaises(TypeError):
+            self.graphite.send("a", None, 1)
+
+        self.assertEqual(self.graphite.held, [self.graphite.sender.build_message("batched", 2, 8)])
+        self.assertEqual(self.graphite.queue, [self.graphite.sender.build_message("queued", 2, 8)])
+        self.assertEqual(len(self.graphite.sender.messages), 1)
+
+    def test_flush(self):
+
+        self.graphite.flush()
+        self.assertEqual(self.graphite.sender.sockets, 0)
+
+        build = self.graphite.sender.build_message
+
+        self.graphite.queue = [build("a", 1, 7), build("b", 2, 8)]
+        self.graphite.flush()
+
+        self.assertEqual(self.graphite.sender.sockets, 1)
+        self.assertEqual(self.graphite.sender.messages, [
+            {
+                "name": "a",
+                "value": 1,
+                "timestamp": 7
+            },
+            {
+                "name": "b",
+                "value": 2,
+                "timestamp": 8
+            }
+        ])
+        self.assertEqual(self.graphite.queue, [])
+        self.assertEqual(self.graphite.flushed, 1)
+
+        self.graphite.queue = [build("a", 1, 7)] * (nandy.store.graphite.BATCH + 1)
+        self.graphite.flush()
+
+        self.assertEqual(self.graphite.sender.sockets, 3)
+        self.assertEqual(len(self.graphite.sender.messages), nandy.store.graphite.BATCH + 3)
+
+        # What doesn't go out is counted as dropped
+
+        self.graphite.queue = [build("a", 1, 7)] * (nandy.store.graphite.BATCH + 1)
+
+        with unittest.mock.patch.object(self.graphite.sender, "send_socket", side_effect=[None, OSError("nope")]), \
+             self.assertRaises(OSError):
+            self.graphite.flush()
+
+        self.assertEqual(self.graphite.dropped, 1)
+        self.assertEqual(self.graphite.flushed, 4)
+        self.assertEqual(self.graphite.queue, [])
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    def test_run(self):
+
+        graphite = nandy.store.graphite.Graphite(interval=0.01)
+
+        graphite.send("a", 1, 7)
+        self.assertEqual(graphite.queue, [graphite.sender.build_message("a", 1, 7)])
+
+        for _ in range(100):
+            if graphite.sender.messages:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(graphite.sender.messages, [{"name": "a", "value": 1, "timestamp": 7}])
+
+        # A failed flush is logged and dropped, and the thread keeps going
+
+        with unittest.mock.patch.object(graphite.sender, "send_socket", side_effect=OSError("nope")), \
+             self.assertLogs("nandy") as logs:
+
+            graphite.send("b", 2, 8)
+
+            for _ in range(100):
+                if logs.output:
+                    break
+                time.sleep(0.01)
+
+        self.assertEqual(graphite.dropped, 1)
+        self.assertIn("graphite flush failed", logs.output[0])
+        self.assertTrue(graphite.thread.is_alive())
+
+        graphite.send("c", 3, 9)
+
+        for _ in range(100):
+            if len(graphite.sender.messages) > 1:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(graphite.sender.messages[-1], {"name": "c", "value": 3, "timestamp": 9})
+
+        graphite.stop()
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    def test_stop(self):
+
+        graphite = nandy.store.graphite.Graphite(interval=60)
+
+        graphite.send("a", 1, 7)
+        graphite.stop()
+
+        self.assertIsNone(graphite.thread)
+        self.assertIsNone(graphite.interval)
+        self.assertEqual(graphite.sender.messages, [{"name": "a", "value": 1, "timestamp": 7}])
+
+        # Back to sending right away
+
+        graphite.send("b", 2, 8)
+        self.assertEqual(len(graphite.sender.messages), 2)
+
+    def test_batch(self):
+
+        with self.graphite.batch() as graphite:
+            graphite.send("a", 1, 7)
+            with graphite.batch():
+                graphite.send("b", 2, 8)
+            self.assertEqual(len(self.graphite.sender.messages), 0)
+
+        self.assertEqual(self.graphite.batching, 0)
+        self.assertEqual(self.graphite.sender.sockets, 1)
+        self.assertEqual(len(self.graphite.sender.messages), 2)
+
+        # Nothing from a failed batch goes out
+
+        with self.assertRaises(Exception):
+            with self.graphite.batch() as graphite:
+                graphite.send("c", 3, 9)
+                raise Exception("whoops")
+
+        self.assertEqual(self.graphite.batching, 0)
+        self.assertEqual(self.graphite.held, [])
+        self.assertEqual(len(self.graphite.sender.messages), 2)
+
+        # Nor does a batch go straight out with an interval
+
+        self.graphite.interval = 60
+
+        with self.graphite.batch() as graphite:
+            graphite.send("d", 4, 10)
+
+        self.assertEqual(self.graphite.queue, [self.graphite.sender.build_message("d", 4, 10)])
+
+        # Other threads aren't batched along with us
+
+        with self.graphite.batch() as graphite:
+
+            thread = threading.Thread(target=lambda: graphite.send("e", 5, 11))
+            thread.start()
+            thread.join()
+
+            self.assertEqual(self.graphite.queue[-1], self.graphite.sender.build_message("e", 5, 11))
+            self.assertEqual(self.graphite.held, [])
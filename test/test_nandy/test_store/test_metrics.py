@@ -0,0 +1,190 @@
+import unittest
+import unittest.mock
+
+import os
+import time
+import threading
+import urllib.request
+
+import nandy.store.graphite
+import nandy.store.metrics
+
+class TestNandyMetrics(unittest.TestCase):
+
+    maxDiff = None
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    def setUp(self):
+
+        self.graphite = nandy.store.graphite.Graphite()
+        self.metrics = nandy.store.metrics.Metrics(self.graphite, buckets=(1, 10))
+
+    def tearDown(self):
+
+        self.metrics.stop()
+
+    def test_Series(self):
+
+        series = nandy.store.metrics.Series((1, 10))
+
+        series.add(5)
+        series.add(-1)
+        series.add(20)
+
+        self.assertEqual(series.count, 3)
+        self.assertEqual(series.sum, 24)
+        self.assertEqual(series.min, -1)
+        self.assertEqual(series.max, 20)
+        self.assertEqual(series.last, 20)
+        self.assertEqual(series.counts, [1, 2])
+
+    def test___init__(self):
+
+        self.assertEqual(self.metrics.graphite, self.graphite)
+        self.assertEqual(self.metrics.prefix, "nandy")
+        self.assertEqual(self.metrics.buckets, (1, 10))
+        self.assertIsNone(self.metrics.thread)
+
+        init = nandy.store.metrics.Metrics(interval=60, prefix="unit")
+
+        self.assertIsNone(init.graphite)
+        self.assertEqual(init.prefix, "unit")
+        self.assertEqual(init.buckets, nandy.store.metrics.BUCKETS)
+        self.assertTrue(init.thread.is_alive())
+
+        init.stop()
+        self.assertIsNone(init.thread)
+
+    def test_send(self):
+
+        self.metrics.send("person", "kid", "act", "good job", 1, 7)
+        self.metrics.send("person", "kid", "act", "good job", -1, 8)
+
+        self.assertEqual(list(self.metrics.series.keys()), [("person", "kid", "act", "good_job")])
+        self.assertEqual(self.metrics.series[("person", "kid", "act", "good_job")].sum, 0)
+        self.assertEqual(self.metrics.totals[("person", "kid", "act", "good_job")].count, 2)
+        self.assertEqual(self.metrics.sent, 2)
+        self.assertEqual(self.graphite.sender.messages, [])
+
+    def test_batch(self):
+
+        with self.metrics.batch() as metrics:
+            metrics.send("a", 1, 7)
+            with metrics.batch():
+                metrics.send("a", 2, 8)
+            self.assertEqual(self.metrics.series, {})
+
+        self.assertEqual(self.metrics.batching, 0)
+        self.assertEqual(self.metrics.series[("a",)].count, 2)
+
+        # Nothing from a failed batch counts
+
+        with self.assertRaises(Exception):
+            with self.metrics.batch() as metrics:
+                metrics.send("a", 3, 9)
+                raise Exception("whoops")
+
+        self.assertEqual(self.metrics.held, [])
+        self.assertEqual(self.metrics.series[("a",)].count, 2)
+
+        # Other threads aren't batched along with us
+
+        with self.metrics.batch() as metrics:
+
+            thread = threading.Thread(target=lambda: metrics.send("a", 4, 10))
+            thread.start()
+            thread.join()
+
+            self.assertEqual(self.metrics.series[("a",)].count, 3)
+            self.assertEqual(self.metrics.held, [])
+
+    @unittest.mock.patch("nandy.store.metrics.time.time")
+    def test_flush(self, mock_time):
+
+        mock_time.return_value = 9
+
+        self.metrics.flush()
+        self.assertEqual(self.metrics.flushed, 0)
+
+        self.metrics.send("chore", "duration", 4, 7)
+        self.metrics.send("chore", "duration", 6, 8)
+        self.metrics.flush()
+
+        self.assertEqual(self.metrics.flushed, 1)
+        self.assertEqual(self.metrics.series, {})
+        self.assertEqual(self.graphite.sender.sockets, 1)
+        self.assertEqual(self.graphite.sender.messages, [
+            {"name": "chore.duration.count", "value": 2, "timestamp": 9},
+            {"name": "chore.duration.sum", "value": 10, "timestamp": 9},
+            {"name": "chore.duration.min", "value": 4, "timestamp": 9},
+            {"name": "chore.duration.max", "value": 6, "timestamp": 9},
+            {"name": "chore.duration.last", "value": 6, "timestamp": 9}
+        ])
+
+    def test_run(self):
+
+        metrics = nandy.store.metrics.Metrics(self.graphite, interval=0.01)
+        metrics.send("a", 1, 7)
+
+        for _ in range(100):
+            if self.graphite.sender.messages:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.graphite.sender.messages[0]["name"], "a.count")
+
+        # A failed flush is logged, and the thread keeps going
+
+        with unittest.mock.patch.object(self.graphite, "send", side_effect=OSError("nope")), \
+             self.assertLogs("nandy") as logs:
+
+            metrics.send("b", 2, 8)
+
+            for _ in range(100):
+                if logs.output:
+                    break
+                time.sleep(0.01)
+
+        self.assertIn("metrics flush failed", logs.output[0])
+        self.assertTrue(metrics.thread.is_alive())
+
+        metrics.send("c", 3, 9)
+
+        for _ in range(100):
+            if any(message["name"] == "c.count" for message in self.graphite.sender.messages):
+                break
+            time.sleep(0.01)
+
+        metrics.stop()
+
+        self.assertIn("c.count", [message["name"] for message in self.graphite.sender.messages])
+        self.assertNotIn("b.count", [message["name"] for message in self.graphite.sender.messages])
+
+    def test_scrape(self):
+
+        self.assertEqual(self.metrics.scrape(), "\n")
+
+        self.metrics.send("chore", "duration", 5, 7)
+        self.metrics.send("chore", "duration", 20, 7)
+        self.metrics.flush()
+
+        self.assertEqual(self.metrics.scrape(), "\n".join([
+            "# TYPE nandy_chore_duration histogram",
+            'nandy_chore_duration_bucket{le="1"} 0',
+            'nandy_chore_duration_bucket{le="10"} 1',
+            'nandy_chore_duration_bucket{le="+Inf"} 2',
+            "nandy_chore_duration_sum 25",
+            "nandy_chore_duration_count 2"
+        ]) + "\n")
+
+    def test_serve(self):
+
+        self.metrics.send("a", 1, 7)
+
+        server = self.metrics.serve(0, "127.0.0.1")
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            self.assertEqual(response.read().decode("utf-8"), self.metrics.scrape())
+
+        self.metrics.stop()
+        self.assertIsNone(self.metrics.server)
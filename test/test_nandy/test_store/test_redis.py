@@ -4,6 +4,9 @@ import unittest.mock
 import os
 import time
 import json
+import asyncio
+import msgpack
+import threading
 
 import nandy.store.redis
 
@@ -16,6 +19,25 @@ class TestNandyRedis(unittest.TestCase):
 
         self.redis = nandy.store.redis.Channel("test")
 
+    def test_encode(self):
+
+        self.assertEqual(nandy.store.redis.encode({"a": 1}), json.dumps({"a": 1}).encode("utf-8"))
+        self.assertEqual(json.loads(nandy.store.redis.encode({"a": 1}, "orjson")), {"a": 1})
+        self.assertEqual(nandy.store.redis.encode({"a": 1}, "msgpack"), b"\x01" + msgpack.packb({"a": 1}, use_bin_type=True))
+
+        # Without orjson, it's just JSON
+
+        with unittest.mock.patch("nandy.store.redis.orjson", None):
+            self.assertEqual(nandy.store.redis.encode({"a": 1}, "orjson"), json.dumps({"a": 1}).encode("utf-8"))
+
+    def test_decode(self):
+
+        for codec in nandy.store.redis.Channel.CODECS:
+            self.assertEqual(nandy.store.redis.decode(nandy.store.redis.encode({"a": [1, "b"]}, codec)), {"a": [1, "b"]})
+
+        with unittest.mock.patch("nandy.store.redis.orjson", None):
+            self.assertEqual(nandy.store.redis.decode(b'{"a": 1}'), {"a": 1})
+
     @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis) 
     def test___init___(self):
 
@@ -24,12 +46,27 @@ class TestNandyRedis(unittest.TestCase):
         self.assertEqual(self.redis.redis.port, 6379)
         self.assertEqual(self.redis.prefix, "nandy")
 
-        init = nandy.store.redis.Channel("unit", "floop", 7, "before")
+        self.assertIsNone(self.redis.size)
+        self.assertEqual(self.redis.published, 0)
+        self.assertEqual(self.redis.flushed, 0)
+
+        init = nandy.store.redis.Channel("unit", "floop", 7, "before", 3)
 
         self.assertEqual(init.channel, "unit")
         self.assertEqual(init.redis.host, "floop")
         self.assertEqual(init.redis.port, 7)
         self.assertEqual(init.prefix, "before")
+        self.assertEqual(init.size, 3)
+        self.assertEqual(self.redis.codec, "json")
+
+        init = nandy.store.redis.Channel("unit", codec="msgpack")
+
+        self.assertEqual(init.codec, "msgpack")
+
+        with unittest.mock.patch.dict(os.environ, {"REDIS_CODEC": "orjson"}):
+            self.assertEqual(nandy.store.redis.Channel("unit").codec, "orjson")
+
+        self.assertRaisesRegex(ValueError, "unknown codec nope", nandy.store.redis.Channel, "unit", codec="nope")
 
     def test_publish(self):
 
@@ -37,6 +74,85 @@ class TestNandyRedis(unittest.TestCase):
 
         self.assertEqual(self.redis.redis.channel, "nandy/test")
         self.assertEqual(self.redis.redis.messages[0], {"data": json.dumps({"a": 1}).encode("utf-8")})
+        self.assertEqual(self.redis.published, 1)
+        self.assertEqual(self.redis.flushed, 1)
+
+        self.redis.batching = 1
+        self.redis.publish({"b": 2})
+
+        self.assertEqual(len(self.redis.redis.messages), 1)
+        self.assertEqual(self.redis.queue, [json.dumps({"b": 2}).encode("utf-8")])
+        self.assertEqual(self.redis.published, 2)
+        self.assertEqual(self.redis.flushed, 1)
+
+        self.redis.size = 2
+        self.redis.publish({"c": 3})
+
+        self.assertEqual(len(self.redis.redis.messages), 3)
+        self.assertEqual(self.redis.queue, [])
+        self.assertEqual(self.redis.published, 3)
+        self.assertEqual(self.redis.flushed, 2)
+
+        self.redis.batching = 0
+        self.redis.codec = "msgpack"
+        self.redis.publish({"d": 4})
+
+        self.assertEqual(self.redis.redis.messages[-1], {"data": b"\x01" + msgpack.packb({"d": 4}, use_bin_type=True)})
+
+    def test_flush(self):
+
+        self.redis.flush()
+        self.assertEqual(self.redis.redis.executed, 0)
+        self.assertEqual(self.redis.flushed, 0)
+
+        self.redis.queue = [json.dumps({"a": 1}), json.dumps({"b": 2})]
+        self.redis.flush()
+
+        self.assertEqual(self.redis.redis.executed, 1)
+        self.assertEqual(self.redis.redis.channel, "nandy/test")
+        self.assertEqual(self.redis.redis.messages, [
+            {"data": json.dumps({"a": 1}).encode("utf-8")},
+            {"data": json.dumps({"b": 2}).encode("utf-8")}
+        ])
+        self.assertEqual(self.redis.queue, [])
+        self.assertEqual(self.redis.flushed, 1)
+
+    def test_batch(self):
+
+        with self.redis.batch() as channel:
+            channel.publish({"a": 1})
+            with channel.batch():
+                channel.publish({"b": 2})
+            self.assertEqual(len(self.redis.redis.messages), 0)
+
+        self.assertEqual(self.redis.batching, 0)
+        self.assertEqual(self.redis.redis.executed, 1)
+        self.assertEqual(self.redis.redis.messages, [
+            {"data": json.dumps({"a": 1}).encode("utf-8")},
+            {"data": json.dumps({"b": 2}).encode("utf-8")}
+        ])
+        self.assertEqual(self.redis.published, 2)
+        self.assertEqual(self.redis.flushed, 1)
+
+        with self.assertRaises(Exception):
+            with self.redis.batch() as channel:
+                channel.publish({"c": 3})
+                raise Exception("whoops")
+
+        self.assertEqual(self.redis.batching, 0)
+        self.assertEqual(self.redis.queue, [])
+        self.assertEqual(len(self.redis.redis.messages), 2)
+
+        # Other threads aren't batched along with us
+
+        with self.redis.batch() as channel:
+
+            thread = threading.Thread(target=lambda: channel.publish({"d": 4}))
+            thread.start()
+            thread.join()
+
+            self.assertEqual(self.redis.redis.messages[-1], {"data": json.dumps({"d": 4}).encode("utf-8")})
+            self.assertEqual(self.redis.queue, [])
 
     def test_subscribe(self):
 
@@ -51,3 +167,52 @@ class TestNandyRedis(unittest.TestCase):
         self.redis.redis.messages.append({"data": json.dumps({"a": 1}).encode("utf-8")})
         self.assertEqual(self.redis.next(), {"a": 1})
         self.assertEqual(self.redis.redis.channel, "nandy/test")
+
+        self.redis.redis.messages.append({"data": 1})
+        self.assertIsNone(self.redis.next())
+
+        start = time.time()
+        self.assertIsNone(self.redis.next(timeout=0.01))
+        self.assertGreaterEqual(time.time() - start, 0.01)
+
+        self.redis.redis.messages.append({"data": 1})
+        self.redis.redis.messages.append({"data": json.dumps({"b": 2}).encode("utf-8")})
+        self.assertEqual(self.redis.next(timeout=1), {"b": 2})
+
+        # Whatever codec the publisher used
+
+        self.redis.redis.messages.append({"data": nandy.store.redis.encode({"c": 3}, "msgpack")})
+        self.assertEqual(self.redis.next(), {"c": 3})
+
+    def test_drain(self):
+
+        self.assertEqual(self.redis.drain(), [])
+
+        for index in range(3):
+            self.redis.redis.messages.append({"data": json.dumps({"a": index}).encode("utf-8")})
+
+        self.assertEqual(self.redis.drain(2), [{"a": 0}, {"a": 1}])
+        self.assertEqual(self.redis.drain(), [{"a": 2}])
+
+    def test_listen(self):
+
+        for index in range(2):
+            self.redis.redis.messages.append({"data": json.dumps({"a": index}).encode("utf-8")})
+
+        async def listen():
+
+            messages = []
+
+            async for message in self.redis:
+                messages.append(message)
+                if len(messages) == 2:
+                    break
+
+            return messages
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            self.assertEqual(loop.run_until_complete(listen()), [{"a": 0}, {"a": 1}])
+        finally:
+            loop.close()